@@ -11,39 +11,69 @@ app = marimo.App(
 
 with app.setup:
     import marimo as mo
-    import pandas as pd
 
 
 @app.cell
 def load_model():
+    import os
+    from concurrent.futures import CancelledError
     from pathlib import Path
-    import roadrunner
-    model_path = Path(__file__).parent.parent / "model" / "glimepiride_body_flat.xml"
-    r: roadrunner.RoadRunner = roadrunner.RoadRunner(str(model_path))
-    model: roadrunner.ExecutableModel = r.model
-    r.timeCourseSelections = ["time", "[Cve_gli]", "[Cve_m1]", "[Cve_m2]", "Aurine_m1_m2"]
-    units = {
-        "time": "hr",
-        "[Cve_gli]": "µM",
-        "[Cve_m1]": "µM",
-        "[Cve_m2]": "µM",
-        "Aurine_m1_m2": "µmole"
-    }
-    units_factors = {
-        "time": 1.0/60,
-        "[Cve_gli]": 1000.0,
-        "[Cve_m1]": 1000.0,
-        "[Cve_m2]": 1000.0,
-        "Aurine_m1_m2": 1000.0
-    }
-    labels = {
-        "time": "<b>Time [hr]</b>",
-        "[Cve_gli]": "<b>Glimepiride Plasma [µM]</b>",
-        "[Cve_m1]": "<b>M1 Plasma [µM]</b>",
-        "[Cve_m2]": "<b>M2 Plasma [µM]</b>",
-        "Aurine_m1_m2": "<b>M1 + M2 Urine [µmole]</b>"
-    }
-    return Path, labels, r, units_factors
+    from glimepiride_app.dose_finding import recommended_doses
+    from glimepiride_app.metrics import metrics
+    from glimepiride_app.model import LABELS
+    from glimepiride_app.multiple_dosing import steady_state_patient
+    from glimepiride_app.population import PopulationRun
+    from glimepiride_app.pk import SUBSTANCES, pk_table
+    from glimepiride_app.scheduler import preview_patient, simulation_scheduler
+    from glimepiride_app.sensitivity import sensitivities
+    from glimepiride_app.simulation import resample
+    labels = LABELS
+    # client of the session in the simulation scheduler, forgotten at the end of the session
+    scheduler_client = simulation_scheduler.client()
+    # only send slider values on release
+    slider_debounce = os.environ.get("GLIMEPIRIDE_SLIDER_DEBOUNCE", "1") == "1"
+    # display a coarse preview before the full-resolution result
+    progressive = os.environ.get("GLIMEPIRIDE_PROGRESSIVE", "1") == "1"
+    return (
+        CancelledError,
+        Path,
+        PopulationRun,
+        SUBSTANCES,
+        labels,
+        metrics,
+        pk_table,
+        preview_patient,
+        progressive,
+        recommended_doses,
+        resample,
+        scheduler_client,
+        sensitivities,
+        simulation_scheduler,
+        slider_debounce,
+        steady_state_patient,
+    )
+
+
+@app.cell
+def refined_state():
+    # full-resolution result (parameters, df) of the progressive mode,
+    # df is None if the simulation failed
+    refined_result, set_refined_result = mo.state(None)
+    return refined_result, set_refined_result
+
+
+@app.cell
+def steady_state_state():
+    # steady-state PK (parameters, pk) of multiple dosing
+    steady_state_result, set_steady_state_result = mo.state(None)
+    return set_steady_state_result, steady_state_result
+
+
+@app.cell
+def population_state():
+    # population bands (parameters, PopulationBands), refined after every chunk
+    population_result, set_population_result = mo.state(None)
+    return population_result, set_population_result
 
 
 @app.cell
@@ -76,7 +106,8 @@ def cirrhosis_state():
 
 @app.cell
 def renal_impairment_state():
-    normal_crcl = 110.0
+    from glimepiride_app.patients import NORMAL_CRCL
+    normal_crcl = NORMAL_CRCL
     crcl_map = {
         "Normal": normal_crcl * 1.0,
         "Mild Impairment": normal_crcl * 0.69,
@@ -174,12 +205,14 @@ def cyp2c9_allele_sliders(
     allele2_activity,
     set_allele1_activity,
     set_allele2_activity,
+    slider_debounce,
 ):
     cyp2c9_allele1_slider = mo.ui.slider(
         start=0,
         stop=100,
         value=allele1_activity(),
         step=1.0,
+        debounce=slider_debounce,
         on_change=set_allele1_activity
     )
 
@@ -188,6 +221,7 @@ def cyp2c9_allele_sliders(
         stop=100,
         value=allele2_activity(),
         step=1.0,
+        debounce=slider_debounce,
         on_change=set_allele2_activity
     )
 
@@ -195,12 +229,13 @@ def cyp2c9_allele_sliders(
 
 
 @app.cell
-def cirrhosis_slider(cirrhosis_degree, set_cirrhosis_degree):
+def cirrhosis_slider(cirrhosis_degree, set_cirrhosis_degree, slider_debounce):
     f_cirrhosis = mo.ui.slider(
         start=0.0,
         stop=0.95,
         value=cirrhosis_degree(),
         step=0.01,
+        debounce=slider_debounce,
         on_change=set_cirrhosis_degree
     )
 
@@ -208,36 +243,85 @@ def cirrhosis_slider(cirrhosis_degree, set_cirrhosis_degree):
 
 
 @app.cell
-def crcl_slider(crcl_value, set_crcl_value):
+def crcl_slider(crcl_value, set_crcl_value, slider_debounce):
     crcl = mo.ui.slider(
         start=1,
         stop=110,
         value=crcl_value(),
         step=1.0,
+        debounce=slider_debounce,
         on_change=set_crcl_value
     )
     return (crcl,)
 
 
 @app.cell
-def dose_slider(dose_value, set_dose_value):
+def dose_slider(dose_value, set_dose_value, slider_debounce):
     PODOSE_gli = mo.ui.slider(
         start=0.0,
         stop=8.0,
         value=dose_value(),
         on_change=set_dose_value,
         step=1.0,
+        debounce=slider_debounce,
     )
     return (PODOSE_gli,)
 
 
 @app.cell
-def bodyweight_slider(bw_value, set_bw_value):
+def regimen_inputs(slider_debounce):
+    doses = mo.ui.slider(
+        start=1,
+        stop=14,
+        value=1,
+        step=1,
+        debounce=slider_debounce,
+    )
+    interval = mo.ui.dropdown(
+        options={"24 h": 24.0, "12 h": 12.0},
+        value="24 h",
+    )
+    return doses, interval
+
+
+@app.cell
+def population_switch():
+    population = mo.ui.switch(value=False)
+    return (population,)
+
+
+@app.cell
+def sensitivity_inputs():
+    sensitivity = mo.ui.switch(value=False)
+    sensitivity_substance = mo.ui.dropdown(
+        options=["Glimepiride", "M1", "M2"],
+        value="Glimepiride",
+    )
+    return sensitivity, sensitivity_substance
+
+
+@app.cell
+def dose_finding_inputs(saved_patients):
+    dose_finding_metric = mo.ui.dropdown(
+        options={"AUC": "auc", "Cmax": "cmax"},
+        value="AUC",
+    )
+    dose_finding_reference = mo.ui.dropdown(
+        options=list(saved_patients().keys()),
+        value="CYP2C9 *1/*1",
+    )
+    dose_finding_button = mo.ui.run_button(label="Find Doses")
+    return dose_finding_button, dose_finding_metric, dose_finding_reference
+
+
+@app.cell
+def bodyweight_slider(bw_value, set_bw_value, slider_debounce):
     BW = mo.ui.slider(
         start=40,
         stop=170.0,
         value=bw_value(),
         on_change=set_bw_value,
+        debounce=slider_debounce,
     )
 
     return (BW,)
@@ -245,107 +329,8 @@ def bodyweight_slider(bw_value, set_bw_value):
 
 @app.cell
 def patients():
-    predefined_patients = {
-        # Cirrhosis patients
-        "CPT A": {
-            "dose": 4.0,
-            "weight": 75.0,
-            "crcl": 110.0,
-            "cirrhosis": 0.3994897959183674,
-            "allele1": 100,
-            "allele2": 100,
-        },
-        "CPT B": {
-            "dose": 4.0,
-            "weight": 75.0,
-            "crcl": 110.0,
-            "cirrhosis": 0.6979591836734694,
-            "allele1": 100,
-            "allele2": 100,
-        },
-        "CPT C": {
-            "dose": 4.0,
-            "weight": 75.0,
-            "crcl": 110.0,
-            "cirrhosis": 0.8127551020408164,
-            "allele1": 100,
-            "allele2": 100,
-        },
-        # Kidney impairment patients
-        "Mild Renal Impairment": {
-            "dose": 4.0,
-            "weight": 75.0,
-            "crcl": 75.9,  # 110 * 0.69
-            "cirrhosis": 0,
-            "allele1": 100,
-            "allele2": 100,
-        },
-        "Moderate Renal Impairment": {
-            "dose": 4.0,
-            "weight": 75.0,
-            "crcl": 35.2,  # 110 * 0.32
-            "cirrhosis": 0,
-            "allele1": 100,
-            "allele2": 100,
-        },
-        "Severe Renal Impairment": {
-            "dose": 4.0,
-            "weight": 75.0,
-            "crcl": 20.9,  # 110 * 0.19
-            "cirrhosis": 0,
-            "allele1": 100,
-            "allele2": 100,
-        },
-        # CYP2C9 genotype
-        "CYP2C9 *1/*1": {
-            "dose": 4.0,
-            "weight": 75.0,
-            "crcl": 110.0,
-            "cirrhosis": 0,
-            "allele1": 100,
-            "allele2": 100,
-        },
-        "CYP2C9 *1/*2": {
-            "dose": 4.0,
-            "weight": 75.0,
-            "crcl": 110.0,
-            "cirrhosis": 0,
-            "allele1": 100,
-            "allele2": 63,
-        },
-        "CYP2C9 *1/*3": {
-            "dose": 4.0,
-            "weight": 75.0,
-            "crcl": 110.0,
-            "cirrhosis": 0,
-            "allele1": 100,
-            "allele2": 23,
-        },
-        "CYP2C9 *2/*2": {
-            "dose": 4.0,
-            "weight": 75.0,
-            "crcl": 110.0,
-            "cirrhosis": 0,
-            "allele1": 63,
-            "allele2": 63,
-        },
-        "CYP2C9 *2/*3": {
-            "dose": 4.0,
-            "weight": 75.0,
-            "crcl": 110.0,
-            "cirrhosis": 0,
-            "allele1": 63,
-            "allele2": 23,
-        },
-        "CYP2C9 *3/*3": {
-            "dose": 4.0,
-            "weight": 75.0,
-            "crcl": 110.0,
-            "cirrhosis": 0,
-            "allele1": 23,
-            "allele2": 23,
-        },
-    }
+    from glimepiride_app.patients import PREDEFINED_PATIENTS
+    predefined_patients = PREDEFINED_PATIENTS
 
     saved_patients = lambda: predefined_patients
 
@@ -402,10 +387,18 @@ def display_with_tabs(
     cyp2c9_allele1_slider,
     cyp2c9_allele2_dropdown,
     cyp2c9_allele2_slider,
+    dose_finding_button,
+    dose_finding_metric,
+    dose_finding_reference,
+    doses,
     f_cirrhosis,
+    interval,
     load_buttons,
+    population,
     renal_impairment_dropdown,
     saved_patients,
+    sensitivity,
+    sensitivity_substance,
 ):
     label_style = {"flex": "1 1 250px", "text-align": "left", "padding-right": "10px"}
 
@@ -419,6 +412,12 @@ def display_with_tabs(
             PODOSE_gli.style({"flex": "2 1 340px"})
         ], align="center", gap=1, wrap=True),
 
+        mo.hstack([
+            mo.md("Number of Doses [-]").style({"flex": "2 1 200px", "text-align": "left"}),
+            doses.style({"flex": "2 1 150px"}),
+            interval.style({"flex": "1 1 150px"})
+        ], align="center", gap=1, wrap=True),
+
         mo.hstack([
             mo.md("Bodyweight [kg]").style(label_style),
             BW.style({"flex": "2 1 340px"})
@@ -450,6 +449,21 @@ def display_with_tabs(
             mo.md("CYP2C9 Allele 2 Activity [%]").style({"flex": "2 1 200px", "text-align": "left"}),
             cyp2c9_allele2_slider.style({"flex": "2 1 150px"}),
             cyp2c9_allele2_dropdown.style({"flex": "1 1 150px"})
+        ], align="center", gap=1, wrap=True),
+
+        mo.md("####**Population Variability**").style({"margin-top": "10px"}),
+
+        mo.hstack([
+            mo.md("5-95 % Bands (BW, CrCl, Cirrhosis, CYP2C9)").style(label_style),
+            population.style({"flex": "2 1 340px"})
+        ], align="center", gap=1, wrap=True),
+
+        mo.md("####**Sensitivity Analysis**").style({"margin-top": "10px"}),
+
+        mo.hstack([
+            mo.md("Sensitivity of Cmax and AUC").style({"flex": "2 1 200px", "text-align": "left"}),
+            sensitivity.style({"flex": "2 1 150px"}),
+            sensitivity_substance.style({"flex": "1 1 150px"})
         ], align="center", gap=1, wrap=True)
     ])
 
@@ -478,10 +492,23 @@ def display_with_tabs(
         )
     ]).style({"font-size": "0.85em"})
 
+    # Dose finding for the example patients
+    dose_finding_content = mo.vstack([
+        mo.md("Doses of the example patients with the exposure of the reference patient (glimepiride)."),
+        mo.hstack([
+            mo.md("Exposure").style({"flex": "1 1 100px", "text-align": "left"}),
+            dose_finding_metric.style({"flex": "1 1 120px"}),
+            mo.md("Reference").style({"flex": "1 1 100px", "text-align": "left"}),
+            dose_finding_reference.style({"flex": "2 1 200px"}),
+            dose_finding_button,
+        ], align="center", gap=1, wrap=True),
+    ])
+
     # Create tabs
     patient_tabs = mo.ui.tabs({
         "Custom Patient": input_patient_content,
-        "Example Patients": example_patients_content
+        "Example Patients": example_patients_content,
+        "Dose Finding": dose_finding_content,
     })
 
     display_with_tabs = mo.md(
@@ -515,50 +542,53 @@ def calculate_cyp2c9_activity(allele1_activity, allele2_activity):
 
 
 @app.cell
-def plots(df, labels):
-    import plotly.express as px
+def figures(labels):
     import plotly.io as pio
+    from glimepiride_app.figures import (
+        create_figures,
+        create_tornado,
+        update_bands,
+        update_figures,
+        update_tornado,
+    )
 
     pio.renderers.default = None # Fix renderer issue
 
-    height = 350
-    width = 410
-
-    fig1 = px.line(df, x="time", y="[Cve_gli]", title=None, labels=labels, markers=False, range_y=[0, 1], range_x=[0, 25], height=height, width=width)
-    fig2 = px.line(df, x="time", y="[Cve_m1]", title=None, labels=labels, markers=False, range_y=[0, 0.2], range_x=[0, 25], height=height, width=width)
-    fig3 = px.line(df, x="time", y="[Cve_m2]", title=None, labels=labels, markers=False, range_y=[0, 0.2], range_x=[0, 25], height=height, width=width)
-    fig4 = px.line(df, x="time", y="Aurine_m1_m2", title=None, labels=labels, markers=False, range_y=[0, 10], height=height, width=width)
+    # figures are created once per session, runs only replace the trace data
+    figures = create_figures(labels)
+    tornado = create_tornado()
+    return figures, tornado, update_bands, update_figures, update_tornado
 
-    axis_style = {
-        "title_font": {"size": 14},
-        "tickfont": {"size": 12}
-    }
 
-    for fig, y_tick_interval, x_tick_interval in [(fig1, 0.2, 5), (fig2, 0.05, 5), (fig3, 0.05, 5), (fig4, 2, 10)]:
-        fig.update_layout(
-            xaxis=dict(
-                **axis_style,
-                dtick=x_tick_interval,
-                gridcolor='lightgray',
-                showline=True,
-                linewidth=1,
-                linecolor='black',
-                mirror=True
-            ),
-            yaxis=dict(
-                **axis_style,
-                dtick=y_tick_interval,
-                gridcolor='lightgray',
-                showline=True,
-                linewidth=1,
-                linecolor='black',
-                mirror=True
+@app.cell
+def plots(
+    df,
+    figures,
+    metrics,
+    parameters,
+    population_result,
+    update_bands,
+    update_figures,
+):
+    # time axis over all doses for multiple dosing
+    _end = parameters["doses"] * parameters["interval"] if parameters["doses"] > 1 else None
+    # population bands of the current patient
+    _population = population_result()
+    _bands = _population[1] if _population and _population[0] == parameters else None
+    # includes the serialization of the figures
+    with metrics.span("plots"):
+        update_figures(figures, df, end=_end)
+        update_bands(figures, _bands)
+        plots = mo.hstack(list(figures.values()), gap=0.5, wrap=True)
+    if _bands and _bands.failed:
+        plots = mo.vstack([
+            mo.callout(
+                mo.md(f"{_bands.failed} of {_bands.replicates} population replicates failed to simulate "
+                      f"and are not included in the bands."),
+                kind="warn",
             ),
-            plot_bgcolor='white'
-        )
-        fig.update_traces(line_width=3)
-
-    plots = mo.hstack([fig1, fig2, fig3, fig4], gap=0.5, wrap=True)
+            plots,
+        ])
 
     return (plots,)
 
@@ -629,89 +659,200 @@ def reference_disclaimer():
 def simulation(
     PODOSE_gli,
     bw_value,
+    doses,
     f_cirrhosis,
     f_cyp2c9,
     f_renal_function,
-    r: "roadrunner.RoadRunner",
-    units_factors,
+    interval,
+    metrics,
+    preview_patient,
+    progressive,
+    scheduler_client,
+    simulation_scheduler,
 ):
-
-    r.resetAll()
-    r.setValue("PODOSE_gli", PODOSE_gli.value)  # [mg]
-    r.setValue("BW", bw_value())  # [kg]
-    r.setValue("f_cirrhosis", f_cirrhosis.value)
-    r.setValue("KI__f_renal_function", f_renal_function)
-    r.setValue("LI__f_cyp2c9", f_cyp2c9)
-    s = r.simulate(start=0, end=60*50, steps=2500)  # [min]
-    df = pd.DataFrame(s, columns=s.colnames)
-    # unit conversions
-    for col in df.columns:
-        df[col] = df[col] * units_factors[col]  # [hr]
-    return (df,)
+    parameters = {
+        "PODOSE_gli": PODOSE_gli.value,  # [mg]
+        "BW": bw_value(),  # [kg]
+        "f_cirrhosis": f_cirrhosis.value,
+        "KI__f_renal_function": f_renal_function,
+        "LI__f_cyp2c9": f_cyp2c9,
+        "doses": doses.value,  # [-]
+        "interval": interval.value,  # [hr]
+    }
+    # spans of this run share the trace id
+    metrics.trace()
+    with metrics.span("simulation"):
+        if progressive:
+            # exact or coarse preview, results in [hr], [µM], [µmole]
+            preview, exact = preview_patient(parameters)
+        else:
+            # latest-wins scheduling, results in [hr], [µM], [µmole]
+            preview, exact = simulation_scheduler.run(scheduler_client.key, parameters), True
+    # stale inputs are superseded by a newer run
+    mo.stop(preview is None)
+    return exact, parameters, preview
 
 
 @app.cell
-def import_pk():
-    from pkdb_analysis.pk.pharmacokinetics import TimecoursePK
-    from pint import UnitRegistry
-    ureg = UnitRegistry()
-    Q_ = ureg.Quantity
-    return Q_, TimecoursePK, ureg
+def simulation_result(exact, parameters, preview, refined_result):
+    # full-resolution result replaces the preview
+    refined = refined_result()
+    _refined = not exact and bool(refined) and refined[0] == parameters
+    df = refined[1] if _refined and refined[1] is not None else preview
+    # failed refinement, the approximate preview stays final
+    refinement_notice = None
+    if _refined and refined[1] is None:
+        refinement_notice = mo.callout(
+            mo.md("The full simulation failed for these parameters, the results shown are an approximate preview."),
+            kind="warn",
+        )
+    return df, refinement_notice
 
 
 @app.cell
-def pk_parameters(PODOSE_gli, Q_, TimecoursePK, df, ureg):
-    pk_results = {}
+def refinement(
+    CancelledError,
+    exact,
+    metrics,
+    parameters,
+    pk_table_display,
+    plots,
+    refined_result,
+    scheduler_client,
+    set_refined_result,
+    simulation_scheduler,
+):
+    # runs after the preview is displayed, the full-resolution result is set
+    # from a background thread, i.e. the kernel is not blocked
+    _preview = (plots, pk_table_display)
+    _refined = refined_result()
+    if not exact and not (_refined and _refined[0] == parameters):
+        _future = simulation_scheduler.submit(scheduler_client.key, parameters)
+
+        def _refine():
+            with metrics.span("refinement"):
+                try:
+                    _df = _future.result()
+                except CancelledError:
+                    return
+                except RuntimeError:
+                    # integrator failure, the preview is marked as approximate
+                    _df = None
+                else:
+                    # superseded requests are discarded
+                    if _df is None:
+                        return
+            # results of invalidated cells are discarded
+            if not mo.current_thread().should_exit:
+                set_refined_result((parameters, _df))
+
+        mo.Thread(target=_refine, daemon=True).start()
+    return
 
-    # Time vector with units
-    t_vec = Q_(df["time"].values, "hour")
 
-    # Get dose value from slider
-    dose_mg = PODOSE_gli.value
+@app.cell
+def population_bands(
+    PopulationRun,
+    metrics,
+    parameters,
+    population,
+    set_population_result,
+):
+    # replicates are added in a background thread which sets the bands after
+    # every chunk, i.e. the plots are redrawn without blocking the kernel; the
+    # run is cancelled when this cell runs again (new parameters, switch off)
+    if population.value and parameters["doses"] == 1:
+        _run = PopulationRun(parameters)
+
+        def _stream():
+            try:
+                while not _run.done:
+                    with metrics.span("population"):
+                        _bands = _run.advance()
+                    if mo.current_thread().should_exit:
+                        return
+                    set_population_result((parameters, _bands))
+            finally:
+                _run.close()
+
+        mo.Thread(target=_stream, daemon=True).start()
+    else:
+        set_population_result(None)
+    return
 
-    # Calculate for glimepiride
-    tcpk_gli = TimecoursePK(
-        time=t_vec,
-        concentration=Q_(df["[Cve_gli]"].values, "micromolar"),
-        dose=Q_(dose_mg, "milligram"),
-        ureg=ureg,
-        substance="glimepiride",
-        min_treshold=100
-    )
 
-    # Calculate for M1
-    tcpk_m1 = TimecoursePK(
-        time=t_vec,
-        concentration=Q_(df["[Cve_m1]"].values, "micromolar"),
-        dose=None,
-        ureg=ureg,
-        substance="M1"
-    )
+@app.cell
+def steady_state(
+    metrics,
+    parameters,
+    set_steady_state_result,
+    steady_state_patient,
+    steady_state_result,
+):
+    # the periodic steady state is solved in a background thread, i.e. the
+    # kernel is not blocked by the Newton iterations
+    _steady_state = steady_state_result()
+    if parameters["doses"] > 1 and not (_steady_state and _steady_state[0] == parameters):
+
+        def _solve():
+            with metrics.span("steady_state_pk"):
+                try:
+                    _pk = steady_state_patient(parameters)
+                except RuntimeError:
+                    # integrator failure, the table shows no values
+                    _pk = None
+            # results of invalidated cells are discarded
+            if not mo.current_thread().should_exit:
+                set_steady_state_result((parameters, _pk))
+
+        mo.Thread(target=_solve, daemon=True).start()
+    return
 
-    # Calculate for M2
-    tcpk_m2 = TimecoursePK(
-        time=t_vec,
-        concentration=Q_(df["[Cve_m2]"].values, "micromolar"),
-        dose=None,
-        ureg=ureg,
-        substance="M2"
-    )
 
-    # Extract results
-    for substance_name, tcpk in [("Glimepiride", tcpk_gli), ("M1", tcpk_m1), ("M2", tcpk_m2)]:
-        pk = tcpk.pk
-        pk_results[substance_name] = {
-            "Cmax [µM]": f"{pk.cmax.magnitude:.2f}",
-            "Tmax [hr]": f"{pk.tmax.magnitude:.1f}",
-            "AUC [µM*hr]": f"{pk.auc.magnitude:.1f}",
-            "Half-life [hr]": f"{pk.thalf.magnitude:.1f}"
-        }
+@app.cell
+def pk_parameters(
+    SUBSTANCES,
+    df,
+    metrics,
+    parameters,
+    pk_table,
+    resample,
+    steady_state_result,
+):
+    pk_results = {}
+
+    if parameters["doses"] == 1:
+        # PK on uniform time steps (adaptive output is resampled), [hr], [µM]
+        with metrics.span("pk_table"):
+            _pk = pk_table(resample(df))
+        for substance_name, pk in _pk.items():
+            pk_results[substance_name] = {
+                "Cmax [µM]": f"{pk.cmax:.2f}",
+                "Tmax [hr]": f"{pk.tmax:.1f}",
+                "AUC [µM*hr]": f"{pk.auc:.1f}",
+                "Half-life [hr]": f"{pk.thalf:.1f}"
+            }
+    else:
+        # dosing interval at the periodic steady state, placeholders until
+        # solved ("…") or if the integration failed ("–")
+        _steady_state = steady_state_result()
+        _solved = bool(_steady_state) and _steady_state[0] == parameters
+        _ss = _steady_state[1] if _solved else None
+        _missing = "–" if _solved else "…"
+        for substance_name in SUBSTANCES:
+            pk = _ss[substance_name] if _ss else None
+            pk_results[substance_name] = {
+                "Cmax,ss [µM]": f"{pk.cmax:.2f}" if pk else _missing,
+                "Cmin,ss [µM]": f"{pk.cmin:.3f}" if pk else _missing,
+                "AUCτ,ss [µM*hr]": f"{pk.auctau:.1f}" if pk else _missing,
+                "Accumulation ratio": f"{pk.accumulation:.2f}" if pk else _missing,
+            }
 
     return (pk_results,)
 
 
 @app.cell
-def pk_table_display(pk_results):
+def pk_table_display(metrics, pk_results):
     # Molecular weights for conversion
     MW = {
         "Glimepiride": 490.62,  # g/mol
@@ -724,7 +865,7 @@ def pk_table_display(pk_results):
     for substance, params in pk_results.items():
         row = {"Substance": substance}
         for key, value in params.items():
-            if "AUC" in key and substance in MW:
+            if "AUC" in key and substance in MW and value not in ("…", "–"):
                 # Extract numeric value from string
                 auc_um_hr = float(value.split()[0])
                 # Convert µM*hr to ng/mL*hr
@@ -734,29 +875,91 @@ def pk_table_display(pk_results):
                 row[key] = value
         display_data.append(row)
 
-    pk_table_display = mo.md(
-        f"""
-        {mo.ui.table(
-            display_data,
-            show_column_summaries=False,
-            show_download=False,
-            label=None,
-            selection=None,
-
-        )}
-        """
-    )
+    with metrics.span("pk_table_display"):
+        pk_table_display = mo.md(
+            f"""
+            {mo.ui.table(
+                display_data,
+                show_column_summaries=False,
+                show_download=False,
+                label=None,
+                selection=None,
+
+            )}
+            """
+        )
 
     return (pk_table_display,)
 
 
+@app.cell
+def sensitivity_display(
+    metrics,
+    parameters,
+    sensitivities,
+    sensitivity,
+    sensitivity_substance,
+    tornado,
+    update_tornado,
+):
+    sensitivity_display = None
+    if sensitivity.value and parameters["PODOSE_gli"] == 0:
+        sensitivity_display = mo.md("Sensitivities are undefined without a dose, select a dose above 0 mg.")
+    elif sensitivity.value:
+        # normalized sensitivities of the single dose PK parameters
+        with metrics.span("sensitivity"):
+            _sensitivities = sensitivities(parameters)
+            update_tornado(tornado, _sensitivities[sensitivity_substance.value])
+            sensitivity_display = mo.vstack([
+                mo.md(f"####**Sensitivity of the {sensitivity_substance.value} PK (single dose)**"),
+                tornado,
+            ])
+    return (sensitivity_display,)
+
+
+@app.cell
+def dose_finding_display(
+    dose_finding_button,
+    dose_finding_metric,
+    dose_finding_reference,
+    recommended_doses,
+):
+    dose_finding_display = None
+    if dose_finding_button.value:
+        _doses = recommended_doses(metric=dose_finding_metric.value, reference=dose_finding_reference.value)
+        _unit = "µM*hr" if dose_finding_metric.value == "auc" else "µM"
+        dose_finding_display = mo.vstack([
+            mo.md(f"####**Doses matching the {dose_finding_metric.selected_key} of {dose_finding_reference.value}**"),
+            mo.ui.table(
+                [
+                    {
+                        "Patient Name": name,
+                        "Dose [mg]": f"{row['dose']:.2f}",
+                        f"{dose_finding_metric.selected_key} [{_unit}]": f"{row['exposure']:.2f}",
+                        "Converged": "yes" if row["converged"] else "no",
+                    }
+                    for name, row in _doses.iterrows()
+                ],
+                show_column_summaries=False,
+                show_download=False,
+                selection=None,
+                pagination=True,
+                page_size=12,
+            ),
+        ]).style({"font-size": "0.85em"})
+    return (dose_finding_display,)
+
+
 @app.cell
 def main_layout(
     reference_disclaimer,
     display_with_tabs,
     model_display,
     pk_table_display,
+    dose_finding_display,
     plots,
+    refinement_notice,
+    sensitivity_display,
 ):
     mo.vstack([
         # Header
@@ -765,10 +968,12 @@ def main_layout(
         # Patient input and PK table
         mo.vstack([
             display_with_tabs,
-            pk_table_display
+            pk_table_display,
+            *[_panel for _panel in (dose_finding_display, sensitivity_display) if _panel is not None],
         ]),
 
         # Plots
+        *[_notice for _notice in (refinement_notice,) if _notice is not None],
         plots,
 
         # Footer
@@ -0,0 +1 @@
+"""Glimepiride Webapp simulation package."""
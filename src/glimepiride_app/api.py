@@ -0,0 +1,209 @@
+"""Stateless HTTP API for simulations and pharmacokinetic parameters.
+
+The API is served next to the marimo UI (mounted at `/`) without per-session
+kernels. Requests are answered from the shared simulation chain (grid, pool
+of RoadRunner instances, simulation cache), serialized responses are cached.
+```
+cd src
+python -m glimepiride_app.api --port 8080
+curl -X POST localhost:8080/api/simulate -d '{"PODOSE_gli": 4, "BW": 75}'
+```
+Missing parameters default to the values of the app, parameters must be
+within PARAMETER_BOUNDS. Multiple doses are
+simulated with the optional regimen parameters `doses` and `interval` [hr],
+the response then contains the PK parameters of the dosing interval at steady
+state instead of the single dose PK parameters. Trajectories are
+returned as JSON (default) or as Arrow IPC stream with
+`Accept: application/vnd.apache.arrow.stream`.
+"""
+
+import argparse
+import io
+import json
+import math
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Tuple
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Mount, Route
+
+from glimepiride_app.metrics import metrics
+from glimepiride_app.model import PARAMETER_BOUNDS, PARAMETERS, SELECTIONS, UNITS
+from glimepiride_app.multiple_dosing import DEFAULT_REGIMEN, REGIMEN, steady_state_patient
+from glimepiride_app.pk import pk_table
+from glimepiride_app.scheduler import simulate_patient
+from glimepiride_app.simulation import resample, simulation_cache
+
+APP_PATH = Path(__file__).parent.parent / "app.py"
+ARROW = "application/vnd.apache.arrow.stream"
+
+# default parameters of the app
+DEFAULT_PARAMETERS = {
+    "PODOSE_gli": 4.0,  # [mg]
+    "BW": 75.0,  # [kg]
+    "f_cirrhosis": 0.0,
+    "KI__f_renal_function": 1.0,
+    "LI__f_cyp2c9": 1.0,
+}
+PK_UNITS = {"cmax": "µM", "tmax": "hr", "auc": "µM*hr", "aucinf": "µM*hr", "kel": "1/hr", "thalf": "hr"}
+# maximal number of doses per request
+MAX_DOSES = int(os.environ.get("GLIMEPIRIDE_API_MAX_DOSES", 28))
+STEADY_STATE_UNITS = {"cmax": "µM", "cmin": "µM", "auctau": "µM*hr", "accumulation": "-"}
+
+
+class ParameterError(ValueError):
+    """Invalid simulation parameters."""
+
+
+def parse_parameters(data: Dict) -> Dict[str, float]:
+    """Model and dosing regimen parameters from the request body.
+
+    :raises ParameterError: for unknown, non-numeric or negative parameters,
+        model parameters outside of PARAMETER_BOUNDS and invalid dosing regimens
+    """
+    if not isinstance(data, dict):
+        raise ParameterError("Request body must be a JSON object.")
+    unknown = set(data) - set(PARAMETERS) - set(REGIMEN)
+    if unknown:
+        raise ParameterError(f"Unknown parameters {sorted(unknown)}, use {PARAMETERS + REGIMEN}.")
+    parameters = {}
+    for pid in PARAMETERS + REGIMEN:
+        value = data.get(pid, {**DEFAULT_PARAMETERS, **DEFAULT_REGIMEN}[pid])
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value < 0:
+            raise ParameterError(f"Parameter '{pid}' must be a non-negative number, got {value!r}.")
+        parameters[pid] = float(value)
+    for pid, (lower, upper) in PARAMETER_BOUNDS.items():
+        if not lower <= parameters[pid] <= upper:
+            raise ParameterError(f"Parameter '{pid}' must be in [{lower:g}, {upper:g}], got {parameters[pid]:g}.")
+    if parameters["doses"] != int(parameters["doses"]) or not 1 <= parameters["doses"] <= MAX_DOSES:
+        raise ParameterError(f"Parameter 'doses' must be an integer in [1, {MAX_DOSES}].")
+    if parameters["interval"] <= 0:
+        raise ParameterError("Parameter 'interval' must be positive.")
+    parameters["doses"] = int(parameters["doses"])
+    return parameters
+
+
+def parameters_key(parameters: Dict[str, float]) -> Tuple[float, ...]:
+    """Canonical key of model parameters (see SimulationCache.key) and dosing regimen."""
+    return simulation_cache.key(parameters) + (parameters["doses"], parameters["interval"])
+
+
+def _finite(value: float):
+    return value if math.isfinite(value) else None
+
+
+@lru_cache(maxsize=int(os.environ.get("GLIMEPIRIDE_API_CACHE_SIZE", 1024)))
+def simulate_response(key: Tuple[float, ...], media_type: str, trajectories: bool) -> bytes:
+    """Serialized response for the canonical parameter key (see parameters_key)."""
+    parameters = dict(zip(PARAMETERS + REGIMEN, key))
+    # multiple doses without trajectories only need the steady state
+    df = simulate_patient(parameters) if trajectories or parameters["doses"] == 1 else None
+    pk = None
+    if parameters["doses"] == 1:
+        with metrics.span("pk_table"):
+            pk = {
+                substance: {name: _finite(value) for name, value in p.__dict__.items()}
+                for substance, p in pk_table(resample(df)).items()
+            }
+    steady_state = {
+        substance: {name: _finite(value) for name, value in p.__dict__.items()}
+        for substance, p in steady_state_patient(parameters).items()
+    } if parameters["doses"] > 1 else None
+    if media_type == ARROW:
+        import pyarrow as pa
+
+        # without trajectories only the schema and the metadata are sent
+        if trajectories:
+            table = pa.Table.from_pandas(df[SELECTIONS], preserve_index=False)
+        else:
+            table = pa.schema([(col, pa.float64()) for col in SELECTIONS]).empty_table()
+        table = table.replace_schema_metadata({
+            "parameters": json.dumps(parameters),
+            **({"pk": json.dumps(pk)} if pk else {}),
+            **({"steady_state": json.dumps(steady_state)} if steady_state else {}),
+            "units": json.dumps(UNITS),
+        })
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue()
+
+    content = {"parameters": parameters}
+    if pk:
+        content["pk"] = pk
+        content["pk_units"] = PK_UNITS
+    if steady_state:
+        content["steady_state"] = steady_state
+        content["steady_state_units"] = STEADY_STATE_UNITS
+    if trajectories:
+        content["units"] = UNITS
+        content["trajectories"] = {col: df[col].tolist() for col in SELECTIONS}
+    return json.dumps(content, ensure_ascii=False, allow_nan=False).encode("utf-8")
+
+
+async def simulate_endpoint(request: Request) -> Response:
+    """POST /api/simulate, query parameter `trajectories=false` returns only PK parameters."""
+    metrics.trace()
+    with metrics.span("api_simulate"):
+        return await _simulate(request)
+
+
+async def _simulate(request: Request) -> Response:
+    try:
+        parameters = parse_parameters(await request.json())
+    except json.JSONDecodeError:
+        return JSONResponse({"error": "Request body must be valid JSON."}, status_code=400)
+    except ParameterError as err:
+        return JSONResponse({"error": str(err)}, status_code=422)
+
+    media_type = ARROW if ARROW in request.headers.get("accept", "") else "application/json"
+    trajectories = request.query_params.get("trajectories", "true").lower() != "false"
+    try:
+        body = await run_in_threadpool(simulate_response, parameters_key(parameters), media_type, trajectories)
+    except RuntimeError as err:
+        # integrator failures, e.g. CVODE convergence failures
+        return JSONResponse({"error": f"Simulation failed: {err}"}, status_code=422)
+    return Response(body, media_type=media_type)
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    """GET /metrics in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+async def health_endpoint(request: Request) -> Response:
+    """GET /api/health"""
+    return JSONResponse({"status": "ok"})
+
+
+def create_app(ui: bool = True) -> Starlette:
+    """API application, optionally with the marimo UI mounted at `/`."""
+    routes = [
+        Route("/api/simulate", simulate_endpoint, methods=["POST"]),
+        Route("/api/health", health_endpoint, methods=["GET"]),
+        Route("/metrics", metrics_endpoint, methods=["GET"]),
+    ]
+    if ui:
+        import marimo
+
+        routes.append(Mount("/", marimo.create_asgi_app(quiet=True).with_app(path="", root=str(APP_PATH)).build()))
+    return Starlette(routes=routes)
+
+
+app = create_app(ui=os.environ.get("GLIMEPIRIDE_UI", "1") == "1")
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the glimepiride simulation API and app.")
+    parser.add_argument("--host", default="127.0.0.1", help="bind host")
+    parser.add_argument("--port", type=int, default=8080, help="bind port")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes")
+    args = parser.parse_args()
+    uvicorn.run("glimepiride_app.api:app", host=args.host, port=args.port, workers=args.workers)
@@ -0,0 +1,208 @@
+"""Batch simulation of virtual patient cohorts.
+
+Patients are simulated in a pool of worker processes, each holding a
+RoadRunner instance cloned from the model compiled once in the parent.
+Results are streamed in completion order with a bounded number of chunks in
+flight and trajectories are written to disk as they arrive, i.e., memory does
+not grow with the cohort size.
+```
+cd src
+python -m glimepiride_app.batch patients.csv --output pk.csv --processes 8
+```
+Patient tables either contain the model parameters (PARAMETERS) or the
+columns of the example patients (dose, weight, crcl, cirrhosis, allele1, allele2).
+Patients with parameters outside of PARAMETER_BOUNDS or failing simulations
+do not abort the batch, they are reported with NaN pk parameters and an error.
+"""
+
+import argparse
+import math
+import numbers
+import os
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from glimepiride_app.model import PARAMETER_BOUNDS, PARAMETERS, SELECTIONS, load_model
+from glimepiride_app.patients import patient_parameters
+from glimepiride_app.pk import PKParameters, pk_table
+from glimepiride_app.simulation import resample, simulate
+
+# result per patient: (index, trajectories [hr, µM, µmole] or None, pk parameters or None, error or None)
+BatchResult = Tuple[Hashable, Optional[np.ndarray], Optional[Dict[str, PKParameters]], Optional[str]]
+
+_r = None
+
+
+def _init_worker(state: bytes) -> None:
+    import roadrunner
+
+    from glimepiride_app.solver import apply_profile, selected_profile
+
+    global _r
+    _r = roadrunner.RoadRunner()
+    _r.loadStateS(state)
+    apply_profile(_r, selected_profile())
+
+
+def _simulate_chunk(
+    chunk: List[Tuple[Hashable, Dict[str, float]]], trajectories: bool, output: str
+) -> List[BatchResult]:
+    results = []
+    for index, parameters in chunk:
+        error = parameter_error(parameters)
+        if error is None:
+            try:
+                df = simulate(_r, parameters, output=output)
+            except RuntimeError as err:
+                # integrator failures only affect the patient
+                error = f"simulation failed: {err}"
+        if error is not None:
+            results.append((index, None, None, error))
+            continue
+        data = df[SELECTIONS].to_numpy(dtype=np.float32) if trajectories else None
+        results.append((index, data, pk_table(resample(df)), None))
+    return results
+
+
+def parameter_error(parameters: Dict[str, float]) -> Optional[str]:
+    """Error message for invalid model parameters, None if valid."""
+    for pid in PARAMETERS:
+        value = parameters.get(pid)
+        if isinstance(value, bool) or not isinstance(value, numbers.Real) or not math.isfinite(value):
+            return f"'{pid}' must be a number, got {value!r}"
+        lower, upper = PARAMETER_BOUNDS[pid]
+        if not lower <= value <= upper:
+            return f"'{pid}' must be in [{lower:g}, {upper:g}], got {value:g}"
+    return None
+
+
+def batch_parameters(patients: pd.DataFrame) -> Iterator[Tuple[Hashable, Dict[str, float]]]:
+    """Model parameters per patient of the patient table.
+
+    Rows which cannot be converted have the original values, these are
+    reported as invalid by the simulation.
+    """
+    model_columns = set(PARAMETERS).issubset(patients.columns)
+    for index, row in patients.iterrows():
+        patient = row.to_dict()
+        if model_columns:
+            yield index, {pid: patient[pid] for pid in PARAMETERS}
+            continue
+        try:
+            yield index, patient_parameters(patient)
+        except TypeError:
+            yield index, patient
+
+
+def iter_batch(
+    patients: pd.DataFrame,
+    processes: Optional[int] = None,
+    chunksize: int = 16,
+    trajectories: bool = True,
+    output: str = "uniform",
+) -> Iterator[BatchResult]:
+    """Simulate all patients, results are yielded in completion order.
+
+    :param patients: patient table
+    :param processes: number of worker processes (default: number of CPUs)
+    :param chunksize: patients per task
+    :param trajectories: return trajectories (float32), otherwise only pk parameters
+    :param output: output mode of the simulations, see `simulate`
+    """
+    processes = processes or os.cpu_count() or 1
+    state = load_model().saveStateS()
+    items = batch_parameters(patients)
+    chunks = iter(lambda: list(islice(items, chunksize)), [])
+    max_pending = 2 * processes
+
+    with ProcessPoolExecutor(
+        max_workers=processes, mp_context=get_context("spawn"), initializer=_init_worker, initargs=(state,)
+    ) as executor:
+        pending = {executor.submit(_simulate_chunk, chunk, trajectories, output) for chunk in islice(chunks, max_pending)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+                chunk = next(chunks, None)
+                if chunk:
+                    pending.add(executor.submit(_simulate_chunk, chunk, trajectories, output))
+
+
+def _write_array(archive: zipfile.ZipFile, name: str, values: np.ndarray) -> None:
+    with archive.open(f"{name}.npy", "w", force_zip64=True) as f:
+        np.lib.format.write_array(f, np.asanyarray(values))
+
+
+def simulate_batch(
+    patients: pd.DataFrame,
+    processes: Optional[int] = None,
+    trajectories: Optional[Path] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+    **kwargs,
+) -> pd.DataFrame:
+    """Simulate all patients.
+
+    Trajectories are written to the npz archive as they are simulated, one
+    array (time, SELECTIONS) per patient with the patient index as name
+    (`np.load(trajectories)[str(index)]`), the columns are stored as `columns`.
+
+    :param trajectories: npz file for the trajectories (default: no trajectories)
+    :param progress: callback with (number of simulated patients, number of patients)
+    :return: pk table with one row per patient, failed patients have NaN pk
+        parameters and the reason in column `error`
+    """
+    rows = {}
+    archive = zipfile.ZipFile(trajectories, "w", allowZip64=True) if trajectories else None
+    try:
+        if archive:
+            _write_array(archive, "columns", np.array(SELECTIONS))
+        for k, (index, values, pk, error) in enumerate(
+            iter_batch(patients, processes=processes, trajectories=archive is not None, **kwargs)
+        ):
+            row = {"error": error}
+            if pk is not None:
+                row.update({
+                    f"{substance}_{key}": value for substance, p in pk.items() for key, value in p.__dict__.items()
+                })
+            rows[index] = row
+            if archive and values is not None:
+                _write_array(archive, str(index), values)
+            if progress:
+                progress(k + 1, len(patients))
+    finally:
+        if archive:
+            archive.close()
+
+    pk_df = pd.DataFrame.from_dict(rows, orient="index").reindex(patients.index)
+    # pk parameters first
+    return pk_df.reindex(columns=[c for c in pk_df.columns if c != "error"] + ["error"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch simulation of a patient table (csv).")
+    parser.add_argument("patients", type=Path, help="patient table (csv)")
+    parser.add_argument("--output", type=Path, required=True, help="pk parameters per patient (csv)")
+    parser.add_argument("--trajectories", type=Path, help="trajectories per patient (npz)")
+    parser.add_argument("--processes", type=int, default=None, help="number of worker processes")
+    args = parser.parse_args()
+
+    patients = pd.read_csv(args.patients)
+    start = time.time()
+
+    def _progress(k: int, n: int) -> None:
+        if k % 100 == 0 or k == n:
+            print(f"{k}/{n} patients ({time.time() - start:.1f} s)", flush=True)
+
+    pk_df = simulate_batch(patients, processes=args.processes, trajectories=args.trajectories, progress=_progress)
+    pk_df.to_csv(args.output)
+    failed = int(pk_df["error"].notna().sum())
+    if failed:
+        print(f"{failed}/{len(pk_df)} patients failed, see column 'error'", flush=True)
@@ -0,0 +1,230 @@
+"""Benchmark of the simulation and PK pipeline.
+
+Measures the stages of the app pipeline headlessly and stores the results as
+JSON baseline. A run can be checked against a baseline (exit code 1 on
+regression)
+```
+cd src
+python -m glimepiride_app.benchmark --output ../benchmarks/baseline.json
+python -m glimepiride_app.benchmark --baseline ../benchmarks/baseline.json --tolerance 0.25
+```
+Baselines are machine specific, compare only runs on the same machine.
+
+The cold benchmarks (model compile, loading the model state and the first
+simulation) run in fresh Python processes, their median over the rounds is
+reported. Of the other benchmarks the best run is reported.
+"""
+
+import argparse
+import json
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+# name: (unit, higher is better)
+BENCHMARKS: Dict[str, Tuple[str, bool]] = {
+    "model_compile": ("s", False),
+    "model_load_state": ("s", False),
+    "simulate_cold": ("s", False),
+    "simulate_warm": ("s", False),
+    "patients_throughput": ("1/s", True),
+    "pk_table": ("s", False),
+    "figures_build": ("s", False),
+    "figures_update": ("s", False),
+    "peak_rss": ("MB", False),
+}
+# benchmarks measured in fresh processes
+COLD = ["model_compile", "model_load_state", "simulate_cold"]
+
+
+def _best_time(f: Callable[[], object], repeat: int) -> float:
+    # minimum is least affected by other load on the machine (see timeit)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run_cold(stage: str, state_dir: Path) -> Dict[str, float]:
+    """Cold benchmarks of a fresh process.
+
+    :param stage: "compile" compiles the model and persists its state,
+        "load" loads the persisted state and runs the first simulation
+    :param state_dir: directory of the model state
+    """
+    import roadrunner  # noqa: F401, import is not part of the benchmarks
+
+    from glimepiride_app.model import load_model
+
+    start = time.perf_counter()
+    r = load_model(state_dir=state_dir)
+    elapsed = time.perf_counter() - start
+    if stage == "compile":
+        return {"model_compile": elapsed}
+
+    from glimepiride_app.patients import PREDEFINED_PATIENTS, patient_parameters
+    from glimepiride_app.simulation import simulate
+    from glimepiride_app.solver import apply_profile, selected_profile
+
+    results = {"model_load_state": elapsed}
+    apply_profile(r, selected_profile())
+    parameters = patient_parameters(next(iter(PREDEFINED_PATIENTS.values())))
+    start = time.perf_counter()
+    simulate(r, parameters)
+    results["simulate_cold"] = time.perf_counter() - start
+    return results
+
+
+def _run_cold_process(stage: str, state_dir: Path) -> Dict[str, float]:
+    process = subprocess.run(
+        [sys.executable, "-m", "glimepiride_app.benchmark", "--cold", stage, "--state-dir", str(state_dir)],
+        cwd=Path(__file__).parent.parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(process.stdout.splitlines()[-1])
+
+
+def run_cold_benchmarks() -> Dict[str, float]:
+    """Cold benchmarks, every stage in a fresh process with an empty state directory."""
+    with tempfile.TemporaryDirectory() as state_dir:
+        return {
+            **_run_cold_process("compile", Path(state_dir)),
+            **_run_cold_process("load", Path(state_dir)),
+        }
+
+
+def run_benchmarks(repeat: int = 20) -> Dict[str, float]:
+    """Run all benchmarks without caches, grid or pool.
+
+    :param repeat: repetitions of the fast benchmarks, the best time is reported
+    """
+    import plotly.io as pio
+
+    from glimepiride_app.figures import create_figures, update_figures
+    from glimepiride_app.model import LABELS, load_model
+    from glimepiride_app.patients import PREDEFINED_PATIENTS, patient_parameters
+    from glimepiride_app.pk import pk_table
+    from glimepiride_app.simulation import simulate
+    from glimepiride_app.solver import apply_profile, selected_profile
+
+    results = run_cold_benchmarks()
+    r = load_model()
+    # integrator settings of the app
+    apply_profile(r, selected_profile())
+
+    patients = [patient_parameters(patient) for patient in PREDEFINED_PATIENTS.values()]
+    df = simulate(r, patients[0])
+    results["simulate_warm"] = _best_time(lambda: simulate(r, patients[0]), repeat)
+
+    start = time.perf_counter()
+    for parameters in patients:
+        simulate(r, parameters)
+    results["patients_throughput"] = len(patients) / (time.perf_counter() - start)
+
+    results["pk_table"] = _best_time(lambda: pk_table(df), 10 * repeat)
+
+    def build() -> None:
+        figures = create_figures(LABELS)
+        update_figures(figures, df)
+        for fig in figures.values():
+            pio.to_json(fig)
+
+    results["figures_build"] = _best_time(build, max(repeat // 4, 1))
+    figures = create_figures(LABELS)
+
+    def update() -> None:
+        update_figures(figures, df)
+        for fig in figures.values():
+            pio.to_json(fig)
+
+    results["figures_update"] = _best_time(update, repeat)
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results["peak_rss"] = rss / (1024 ** 2 if sys.platform == "darwin" else 1024)
+    return results
+
+
+def summarize(runs: List[Dict[str, float]]) -> Dict[str, float]:
+    """Result per benchmark of repeated runs.
+
+    Cold benchmarks report the median, the other benchmarks the best run.
+    """
+    return {
+        name: (statistics.median if name in COLD else max if BENCHMARKS[name][1] else min)(run[name] for run in runs)
+        for name in runs[0]
+    }
+
+
+def metadata() -> Dict[str, str]:
+    """Environment of the benchmark run."""
+    import roadrunner
+
+    from glimepiride_app.model import model_hash
+
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "roadrunner": roadrunner.__version__,
+        "model_hash": model_hash(),
+    }
+
+
+def regressions(results: Dict[str, float], baseline: Dict[str, float], tolerance: float) -> Dict[str, float]:
+    """Benchmarks worse than the baseline by more than the relative tolerance.
+
+    :return: relative change per regressed benchmark
+    """
+    changes = {}
+    for name, value in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        change = value / reference - 1.0
+        worse = -change if BENCHMARKS[name][1] else change
+        if worse > tolerance:
+            changes[name] = change
+    return changes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of the glimepiride simulation and PK pipeline.")
+    parser.add_argument("--output", type=Path, help="write results as baseline (json)")
+    parser.add_argument("--baseline", type=Path, help="check results against baseline (json)")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument("--repeat", type=int, default=20, help="repetitions of the fast benchmarks")
+    parser.add_argument("--rounds", type=int, default=3, help="runs of the benchmark suite")
+    parser.add_argument("--cold", choices=["compile", "load"], help=argparse.SUPPRESS)
+    parser.add_argument("--state-dir", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.cold:
+        # stage of the cold benchmarks in a fresh process, see run_cold_benchmarks
+        print(json.dumps(run_cold(args.cold, args.state_dir)))
+        sys.exit(0)
+
+    results = summarize([run_benchmarks(repeat=args.repeat) for _ in range(args.rounds)])
+    baseline = json.loads(args.baseline.read_text())["results"] if args.baseline else {}
+    changes = regressions(results, baseline, args.tolerance) if baseline else {}
+
+    print(f"{'benchmark':<24}{'value':>12}{'baseline':>12}  unit")
+    print("-" * 56)
+    for name, value in results.items():
+        reference = f"{baseline[name]:>12.4g}" if name in baseline else f"{'':>12}"
+        print(f"{name:<24}{value:>12.4g}{reference}  {BENCHMARKS[name][0]}{'  REGRESSION' if name in changes else ''}")
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps({"metadata": metadata(), "results": results}, indent=2) + "\n")
+    sys.exit(1 if changes else 0)
@@ -0,0 +1,134 @@
+"""Inverse dosing: dose matching a target exposure.
+
+The dose giving the exposure (AUC or Cmax) of a reference patient is found
+by secant iterations starting from the dose-proportional guess. Exposures
+are nearly linear in dose, so a few simulations per patient suffice.
+Simulations are taken from the simulation cache.
+```
+cd src
+python -m glimepiride_app.dose_finding --metric auc --reference "CYP2C9 *1/*1"
+```
+"""
+
+import argparse
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+
+from glimepiride_app.metrics import metrics
+from glimepiride_app.model import PARAMETER_BOUNDS
+from glimepiride_app.patients import PREDEFINED_PATIENTS, patient_parameters
+from glimepiride_app.pk import pk_table
+from glimepiride_app.pool import roadrunner_pool
+from glimepiride_app.simulation import resample, simulation_cache
+
+METRICS = ["auc", "cmax"]
+REFERENCE_PATIENT = "CYP2C9 *1/*1"
+# dose range of the search [mg]
+DOSE_BOUNDS = PARAMETER_BOUNDS["PODOSE_gli"]
+
+
+def exposure(parameters: Dict[str, float], metric: str = "auc", substance: str = "Glimepiride") -> float:
+    """PK parameter of the substance for the patient parameters.
+
+    :param metric: PK parameter, one of METRICS
+    """
+    with roadrunner_pool.checkout() as r:
+        df = simulation_cache.simulate(r, parameters)
+    return float(getattr(pk_table(resample(df))[substance], metric))
+
+
+@dataclass
+class DoseResult:
+    """Dose matching the target exposure."""
+
+    dose: float  # [mg]
+    exposure: float
+    target: float
+    evaluations: int
+    converged: bool
+
+
+def find_dose(
+    parameters: Dict[str, float],
+    target: float,
+    metric: str = "auc",
+    substance: str = "Glimepiride",
+    tolerance: float = 1e-3,
+    max_iterations: int = 10,
+    bounds: Tuple[float, float] = DOSE_BOUNDS,
+) -> DoseResult:
+    """Dose for the patient with the target exposure.
+
+    Secant iterations on the exposure as function of the dose, starting from
+    the given dose and the dose-proportional guess. Doses are limited to the
+    bounds.
+
+    :param parameters: patient parameters, the dose `PODOSE_gli` is the start value
+    :param target: target exposure in the units of the PK parameter
+    :param tolerance: maximal relative deviation from the target
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Unsupported metric '{metric}', use one of {METRICS}.")
+
+    def f(dose: float) -> float:
+        return exposure({**parameters, "PODOSE_gli": dose}, metric=metric, substance=substance)
+
+    d0 = float(parameters["PODOSE_gli"]) or 1.0
+    e0 = f(d0)
+    evaluations = 1
+    if abs(e0 / target - 1.0) <= tolerance:
+        return DoseResult(dose=d0, exposure=e0, target=target, evaluations=evaluations, converged=True)
+    # dose-proportional guess
+    d1 = min(max(d0 * target / e0, bounds[0]), bounds[1]) if e0 > 0 else bounds[1]
+    e1 = f(d1)
+    evaluations += 1
+    while abs(e1 / target - 1.0) > tolerance and evaluations < max_iterations:
+        if e1 == e0:
+            break
+        d0, e0, d1 = d1, e1, min(max(d1 + (target - e1) * (d1 - d0) / (e1 - e0), bounds[0]), bounds[1])
+        if d1 == d0:
+            break
+        e1 = f(d1)
+        evaluations += 1
+    return DoseResult(
+        dose=d1, exposure=e1, target=target, evaluations=evaluations,
+        converged=abs(e1 / target - 1.0) <= tolerance,
+    )
+
+
+def recommended_doses(
+    metric: str = "auc",
+    substance: str = "Glimepiride",
+    reference: str = REFERENCE_PATIENT,
+    patients: Optional[Dict[str, Dict[str, float]]] = None,
+) -> pd.DataFrame:
+    """Doses of the example patients matching the exposure of the reference patient.
+
+    The reference exposure is the one of the reference patient at its dose.
+
+    :return: table with one row per patient (dose [mg], exposure, target, evaluations, converged)
+    """
+    patients = patients or PREDEFINED_PATIENTS
+    with metrics.span("dose_finding"):
+        target = exposure(patient_parameters(PREDEFINED_PATIENTS[reference]), metric=metric, substance=substance)
+        rows = {
+            name: find_dose(patient_parameters(patient), target, metric=metric, substance=substance).__dict__
+            for name, patient in patients.items()
+        }
+    return pd.DataFrame.from_dict(rows, orient="index")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Doses of the example patients matching a reference exposure.")
+    parser.add_argument("--metric", choices=METRICS, default="auc", help="matched PK parameter")
+    parser.add_argument("--substance", default="Glimepiride", help="substance of the PK parameter")
+    parser.add_argument("--reference", default=REFERENCE_PATIENT, help="reference patient")
+    args = parser.parse_args()
+
+    start = time.time()
+    df = recommended_doses(metric=args.metric, substance=args.substance, reference=args.reference)
+    print(df.to_string(float_format=lambda v: f"{v:.3f}"))
+    print(f"{int(df['evaluations'].sum())} evaluations in {time.time() - start:.2f} s")
@@ -0,0 +1,214 @@
+"""Plotly figures of the simulation results.
+
+Figures are created once with the full layout and reused, between runs only
+the trace data is replaced in place. Trace data is stored as float32 arrays
+which plotly serializes as base64 typed arrays instead of JSON float lists.
+
+Trajectories are downsampled to the visible time range with min/max
+decimation per pixel column, i.e., a few hundred points per trace which
+include the exact extrema (Cmax).
+
+Optional population bands (5-95 % range and median) are drawn as additional
+traces behind the patient curve. Sensitivities are shown as tornado chart.
+"""
+
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+    from glimepiride_app.population import PopulationBands
+
+HEIGHT = 350
+WIDTH = 410
+# pixel columns for downsampling, plot area without the default margins (l=80, r=80) [px]
+PIXELS = WIDTH - 160
+
+# column: (range_y, range_x, y tick interval, x tick interval)
+FIGURES: Dict[str, Tuple[List[float], Optional[List[float]], float, float]] = {
+    "[Cve_gli]": ([0, 1], [0, 25], 0.2, 5),
+    "[Cve_m1]": ([0, 0.2], [0, 25], 0.05, 5),
+    "[Cve_m2]": ([0, 0.2], [0, 25], 0.05, 5),
+    "Aurine_m1_m2": ([0, 10], None, 2, 10),
+}
+
+_AXIS_STYLE = {
+    "title_font": {"size": 14},
+    "tickfont": {"size": 12},
+    "gridcolor": "lightgray",
+    "showline": True,
+    "linewidth": 1,
+    "linecolor": "black",
+    "mirror": True,
+}
+BAND_COLOR = "rgba(99, 110, 250, 0.2)"
+
+# parameter labels of the tornado chart
+SENSITIVITY_LABELS = {
+    "PODOSE_gli": "Dose",
+    "BW": "Bodyweight",
+    "f_cirrhosis": "Cirrhosis",
+    "KI__f_renal_function": "Renal function",
+    "LI__f_cyp2c9": "CYP2C9 activity",
+}
+# pk parameter: (label, color)
+SENSITIVITY_METRICS = {"cmax": ("Cmax", "#636efa"), "auc": ("AUC", "#ef553b")}
+
+
+def create_figure(column: str, labels: Dict[str, str]) -> "go.Figure":
+    """Styled figure with empty band traces and the line trace (last) for the column."""
+    import plotly.graph_objects as go
+
+    range_y, range_x, dtick_y, dtick_x = FIGURES[column]
+    empty = np.empty(0, dtype=np.float32)
+    fig = go.Figure([
+        # population bands: 5 %, 95 % (filled to 5 %), median
+        go.Scatter(x=empty, y=empty, mode="lines", line={"width": 0}, hoverinfo="skip", showlegend=False),
+        go.Scatter(
+            x=empty, y=empty, mode="lines", line={"width": 0}, fill="tonexty", fillcolor=BAND_COLOR,
+            hoverinfo="skip", showlegend=False,
+        ),
+        go.Scatter(
+            x=empty, y=empty, mode="lines", line={"color": "#636efa", "width": 1, "dash": "dash"},
+            hoverinfo="skip", showlegend=False,
+        ),
+        go.Scatter(
+            x=empty,
+            y=empty,
+            mode="lines",
+            line={"color": "#636efa", "width": 3},
+            hovertemplate=f"{labels['time']}=%{{x}}<br>{labels[column]}=%{{y}}<extra></extra>",
+            showlegend=False,
+        ),
+    ])
+    fig.update_layout(
+        xaxis=dict(**_AXIS_STYLE, title_text=labels["time"], range=range_x, dtick=dtick_x),
+        yaxis=dict(**_AXIS_STYLE, title_text=labels[column], range=range_y, dtick=dtick_y),
+        plot_bgcolor="white",
+        margin={"t": 60},
+        height=HEIGHT,
+        width=WIDTH,
+    )
+    return fig
+
+
+def create_figures(labels: Dict[str, str]) -> Dict[str, "go.Figure"]:
+    """Figures of all plotted columns."""
+    return {column: create_figure(column, labels) for column in FIGURES}
+
+
+def downsample(
+    t: np.ndarray, y: np.ndarray, range_x: Optional[List[float]] = None, pixels: int = PIXELS
+) -> np.ndarray:
+    """Indices of the points to plot via min/max decimation.
+
+    The visible time range is split into pixel columns, in every column the
+    points with minimal and maximal value are kept. The first and last point
+    and the neighbours outside of the visible range are always kept, so the
+    line extends to the plot borders.
+
+    :param t: time (sorted)
+    :param y: values
+    :param range_x: visible time range (default: all time points)
+    :param pixels: number of pixel columns
+    """
+    start, end = (0, len(t)) if range_x is None else (
+        max(int(np.searchsorted(t, range_x[0], side="right")) - 1, 0),
+        min(int(np.searchsorted(t, range_x[1], side="left")) + 1, len(t)),
+    )
+    if end - start <= 2 * pixels:
+        return np.arange(start, end)
+
+    # index boundaries of the pixel columns
+    edges = np.searchsorted(t[start:end], np.linspace(t[start], t[end - 1], pixels + 1)) + start
+    edges[-1] = end
+    edges = np.unique(edges)
+    counts = np.diff(edges)
+    index = edges[:-1, None] + np.arange(counts.max())
+    valid = index < edges[1:, None]
+    values = y[np.minimum(index, end - 1)]
+    rows = np.arange(len(counts))
+    imin = index[rows, np.where(valid, values, np.inf).argmin(axis=1)]
+    imax = index[rows, np.where(valid, values, -np.inf).argmax(axis=1)]
+    return np.unique(np.concatenate([[start, end - 1], imin, imax]))
+
+
+def update_figures(figures: Dict[str, "go.Figure"], df: pd.DataFrame, end: Optional[float] = None) -> None:
+    """Replace the trace data of the figures in place.
+
+    :param df: simulation results with time [hr]
+    :param end: end of the time axis [hr], e.g. for multiple doses, the value
+        axes are scaled automatically. Default are the single dose axes.
+    """
+    t = df["time"].to_numpy()
+    for column, fig in figures.items():
+        range_y, range_x, dtick_y, dtick_x = FIGURES[column]
+        if end is not None:
+            range_y, range_x, dtick_y, dtick_x = None, [0, end], None, None
+        y = df[column].to_numpy()
+        index = downsample(t, y, range_x=range_x)
+        with fig.batch_update():
+            fig.data[-1].update(x=t[index].astype(np.float32), y=y[index].astype(np.float32))
+            fig.update_layout(
+                xaxis={"range": range_x, "dtick": dtick_x},
+                yaxis={"range": range_y, "dtick": dtick_y, "autorange": range_y is None},
+            )
+
+
+def update_bands(figures: Dict[str, "go.Figure"], bands: Optional["PopulationBands"]) -> None:
+    """Replace the population bands of the figures in place, None removes the bands.
+
+    :param bands: 5 %, 50 % and 95 % quantiles of the population
+    """
+    for column, fig in figures.items():
+        if bands is None:
+            x = y_low = y_median = y_high = np.empty(0, dtype=np.float32)
+        else:
+            x = bands.time.astype(np.float32)
+            y_low, y_median, y_high = bands.values[column].astype(np.float32)
+        with fig.batch_update():
+            fig.data[0].update(x=x, y=y_low)
+            fig.data[1].update(x=x, y=y_high)
+            fig.data[2].update(x=x, y=y_median)
+
+
+def create_tornado() -> "go.Figure":
+    """Tornado chart of the normalized sensitivities with one empty bar trace per PK parameter."""
+    import plotly.graph_objects as go
+
+    fig = go.Figure([
+        go.Bar(
+            x=np.empty(0), y=[], orientation="h", name=label, marker_color=color,
+            hovertemplate=f"{label}: %{{x:.2f}}<extra>%{{y}}</extra>",
+        )
+        for label, color in SENSITIVITY_METRICS.values()
+    ])
+    fig.update_layout(
+        barmode="group",
+        xaxis=dict(**_AXIS_STYLE, title_text="Normalized sensitivity d ln(PK) / d ln(p)", zeroline=True,
+                   zerolinecolor="black"),
+        yaxis=dict(**_AXIS_STYLE),
+        legend={"orientation": "h", "y": 1.12},
+        plot_bgcolor="white",
+        margin={"t": 60},
+        height=HEIGHT,
+        width=2 * WIDTH,
+    )
+    return fig
+
+
+def update_tornado(fig: "go.Figure", sensitivities: Dict[str, Dict[str, float]]) -> None:
+    """Replace the bars in place, parameters are sorted by the largest absolute sensitivity.
+
+    :param sensitivities: PK parameter -> parameter -> sensitivity of one substance
+    """
+    pids = sorted(SENSITIVITY_LABELS, key=lambda pid: max(abs(sensitivities[m][pid]) for m in SENSITIVITY_METRICS))
+    with fig.batch_update():
+        for trace, metric in zip(fig.data, SENSITIVITY_METRICS):
+            trace.update(
+                x=np.array([sensitivities[metric][pid] for pid in pids]),
+                y=[SENSITIVITY_LABELS[pid] for pid in pids],
+            )
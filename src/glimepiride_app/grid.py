@@ -0,0 +1,211 @@
+"""Precomputed simulation grid with multilinear interpolation.
+
+The grid is built offline via
+```
+cd src
+python -m glimepiride_app.grid
+```
+and answers requests within the grid by table lookup or multilinear
+interpolation. Requests outside of the grid or with an estimated
+interpolation error above the tolerance return None and must be simulated.
+The grid is simulated with the solver profile of the RoadRunner pool (see
+`glimepiride_app.solver`), grids of another profile are not loaded.
+"""
+
+import argparse
+import itertools
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from glimepiride_app.metrics import metrics
+from glimepiride_app.model import MODEL_PATH, PARAMETERS, SELECTIONS, load_model, model_hash
+from glimepiride_app.solver import PROFILES, SolverProfile, apply_profile, selected_profile
+
+logger = logging.getLogger(__name__)
+
+GRID_PATH = MODEL_PATH.parent / "glimepiride_grid.npz"
+
+# grid axes, all example patients are grid nodes
+GRID_AXES: Dict[str, List[float]] = {
+    "PODOSE_gli": [0.0, 1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0],  # [mg]
+    "BW": [40.0, 75.0, 110.0, 170.0],  # [kg]
+    "f_cirrhosis": [0.0, 0.3994897959183674, 0.6979591836734694, 0.8127551020408164, 0.95],
+    "KI__f_renal_function": [1/110, 0.19, 0.32, 0.69, 1.0],
+    "LI__f_cyp2c9": [0.0, 0.23, 0.43, 0.615, 0.63, 0.815, 1.0],
+}
+GRID_STEPS = 500
+
+
+class SimulationGrid:
+    """Simulation results on a rectilinear grid of the patient parameters."""
+
+    def __init__(
+        self,
+        axes: Dict[str, np.ndarray],
+        time: np.ndarray,
+        values: np.ndarray,
+        profile: str,
+        tolerance: float = 0.01,
+    ):
+        """Create grid.
+
+        :param axes: grid nodes per parameter in order of PARAMETERS
+        :param time: time points [hr]
+        :param values: outputs with shape (*grid_shape, n_outputs, n_time)
+        :param profile: name of the solver profile of the simulations
+        :param tolerance: maximal estimated relative interpolation error
+        """
+        self.axes = [np.asarray(axes[pid], dtype=float) for pid in PARAMETERS]
+        self.time = time
+        self.values = values
+        self.profile = profile
+        self.tolerance = tolerance
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def load(cls, path: Path = GRID_PATH, tolerance: float = 0.01) -> Optional["SimulationGrid"]:
+        """Load grid from file, None if missing or built for another model or solver profile."""
+        path = Path(path)
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            if str(data["model_hash"]) != model_hash():
+                logger.warning(f"Simulation grid '{path}' is outdated, rebuild the grid.")
+                return None
+            profile = str(data["profile"]) if "profile" in data.files else None
+            if profile != selected_profile().name:
+                logger.warning(
+                    f"Simulation grid '{path}' was built with solver profile '{profile}' instead of "
+                    f"'{selected_profile().name}', rebuild the grid."
+                )
+                return None
+            axes = {pid: data[f"axis_{pid}"] for pid in PARAMETERS}
+            return cls(axes=axes, time=data["time"], values=data["values"], profile=profile, tolerance=tolerance)
+
+    def save(self, path: Path = GRID_PATH) -> None:
+        """Save grid to file."""
+        np.savez(
+            path,
+            model_hash=np.array(model_hash()),
+            profile=np.array(self.profile),
+            time=self.time,
+            values=self.values,
+            **{f"axis_{pid}": axis for pid, axis in zip(PARAMETERS, self.axes)},
+        )
+
+    def interpolate(self, parameters: Dict[str, float]):
+        """Interpolated outputs and estimated relative error.
+
+        The error is estimated from the second derivative along each axis,
+        |f''| (x - x_i) (x_{i+1} - x) / 2, relative to the maximum of each output.
+
+        :return: tuple (values, error) or None if outside of the grid
+        """
+        lower = []
+        weights = []
+        error = np.zeros(self.values.shape[-2:])
+        for d, axis in enumerate(self.axes):
+            x = float(parameters[PARAMETERS[d]])
+            if not axis[0] <= x <= axis[-1]:
+                return None
+            i = min(int(np.searchsorted(axis, x, side="right")) - 1, len(axis) - 2)
+            w = (x - axis[i]) / (axis[i + 1] - axis[i])
+            lower.append(i)
+            weights.append(w)
+
+        nearest = tuple(i + int(round(w)) for i, w in zip(lower, weights))
+        for d, axis in enumerate(self.axes):
+            i, w = lower[d], weights[d]
+            if w == 0.0 or len(axis) < 3:
+                continue
+            j = min(max(nearest[d], 1), len(axis) - 2)
+            h_l, h_r = axis[j] - axis[j - 1], axis[j + 1] - axis[j]
+            f = [self.values[nearest[:d] + (k,) + nearest[d + 1:]] for k in (j - 1, j, j + 1)]
+            d2f = 2 * ((f[2] - f[1]) / h_r - (f[1] - f[0]) / h_l) / (h_l + h_r)
+            h = axis[i + 1] - axis[i]
+            error += np.abs(d2f) * (w * h) * ((1 - w) * h) / 2
+
+        values = np.zeros(self.values.shape[-2:])
+        for corner in itertools.product((0, 1), repeat=len(self.axes)):
+            weight = 1.0
+            for c, w in zip(corner, weights):
+                weight *= w if c else 1 - w
+            if weight == 0.0:
+                continue
+            index = tuple(i + c for i, c in zip(lower, corner))
+            values += weight * self.values[index]
+
+        scale = np.maximum(np.abs(values).max(axis=1, keepdims=True), 1e-12)
+        return values, float((error / scale).max())
+
+    def lookup(self, parameters: Dict[str, float]) -> Optional[pd.DataFrame]:
+        """Simulation results from the grid or None if not within tolerance."""
+        result = self.interpolate(parameters)
+        if result is None or result[1] > self.tolerance:
+            self.misses += 1
+            return None
+        self.hits += 1
+        values = result[0]
+        df = pd.DataFrame(values.T, columns=SELECTIONS[1:])
+        df.insert(0, "time", self.time)
+        return df
+
+
+def build_grid(
+    axes: Dict[str, List[float]] = GRID_AXES, steps: int = GRID_STEPS, profile: Optional[SolverProfile] = None
+) -> SimulationGrid:
+    """Simulate all grid nodes.
+
+    :param profile: solver profile of the simulations (default: profile of the RoadRunner pool)
+    """
+    from glimepiride_app.simulation import simulate
+
+    profile = profile or selected_profile()
+    r = load_model()
+    apply_profile(r, profile)
+    shape = tuple(len(axes[pid]) for pid in PARAMETERS)
+    values = np.zeros(shape + (len(SELECTIONS) - 1, steps + 1), dtype=np.float32)
+    n = int(np.prod(shape))
+    df = None
+    start = time.time()
+    for k, index in enumerate(itertools.product(*(range(s) for s in shape))):
+        parameters = {pid: axes[pid][i] for pid, i in zip(PARAMETERS, index)}
+        df = simulate(r, parameters, steps=steps)
+        values[index] = df[SELECTIONS[1:]].to_numpy().T
+        if (k + 1) % 500 == 0 or k + 1 == n:
+            logger.info(f"{k + 1}/{n} grid simulations ({time.time() - start:.1f} s)")
+
+    return SimulationGrid(axes=axes, time=df["time"].to_numpy(), values=values, profile=profile.name)
+
+
+def _load_default() -> Optional[SimulationGrid]:
+    return SimulationGrid.load(
+        path=os.environ.get("GLIMEPIRIDE_GRID", GRID_PATH),
+        tolerance=float(os.environ.get("GLIMEPIRIDE_GRID_TOLERANCE", 0.01)),
+    )
+
+
+simulation_grid = _load_default()
+metrics.register("grid_hits_total", "counter", "Simulation grid hits.", lambda: simulation_grid.hits if simulation_grid else 0)
+metrics.register("grid_misses_total", "counter", "Simulation grid misses.", lambda: simulation_grid.misses if simulation_grid else 0)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(description="Build the glimepiride simulation grid.")
+    parser.add_argument("--output", type=Path, default=GRID_PATH, help="grid file (.npz)")
+    parser.add_argument("--steps", type=int, default=GRID_STEPS, help="time steps per simulation")
+    parser.add_argument(
+        "--profile", choices=list(PROFILES), help="solver profile (default: GLIMEPIRIDE_SOLVER_PROFILE)"
+    )
+    args = parser.parse_args()
+    grid = build_grid(steps=args.steps, profile=PROFILES[args.profile] if args.profile else None)
+    grid.save(args.output)
+    logger.info(f"Simulation grid written to '{args.output}'")
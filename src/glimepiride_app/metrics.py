@@ -0,0 +1,98 @@
+"""Latency histograms per pipeline stage and Prometheus metrics.
+
+Stages are timed with `span`, e.g.
+```
+with metrics.span("simulate"):
+    ...
+```
+`render` returns all metrics in the Prometheus text format (served at
+`/metrics` by `glimepiride_app.api`). Counters of other modules are
+registered as collectors and read on rendering. Optionally, every span is
+written as JSON line to a trace log (env GLIMEPIRIDE_TRACE_LOG), spans of
+one request or app run share the trace id.
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# upper bounds of the histogram buckets [s]
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# trace id of the current request or app run
+trace_id: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+
+
+class Metrics:
+    """Stage latency histograms and registered collectors."""
+
+    def __init__(self, prefix: str = "glimepiride", buckets: Tuple[float, ...] = BUCKETS, trace_log: Optional[str] = None):
+        self.prefix = prefix
+        self.buckets = buckets
+        # stage: (bucket counts, sum, count)
+        self._histograms: Dict[str, Tuple[List[int], float, int]] = {}
+        # name: (type, help, value function)
+        self._collectors: Dict[str, Tuple[str, str, Callable[[], float]]] = {}
+        self._lock = threading.Lock()
+        self._trace_log = open(trace_log, "a", buffering=1) if trace_log else None
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """Add duration of stage to its histogram."""
+        with self._lock:
+            counts, total, count = self._histograms.get(stage) or ([0] * (len(self.buckets) + 1), 0.0, 0)
+            counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self._histograms[stage] = (counts, total + seconds, count + 1)
+            if self._trace_log:
+                self._trace_log.write(json.dumps({
+                    "trace": trace_id.get(), "stage": stage, "time": time.time(), "seconds": seconds,
+                }) + "\n")
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        """Time the enclosed stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def trace(self) -> str:
+        """Start a new trace in the current context."""
+        tid = uuid.uuid4().hex[:16]
+        trace_id.set(tid)
+        return tid
+
+    def register(self, name: str, kind: str, documentation: str, value: Callable[[], float]) -> None:
+        """Register a counter or gauge, the value is read on rendering.
+
+        :param kind: Prometheus metric type, "counter" or "gauge"
+        """
+        self._collectors[f"{self.prefix}_{name}"] = (kind, documentation, value)
+
+    def render(self) -> str:
+        """Metrics in the Prometheus text format."""
+        name = f"{self.prefix}_stage_seconds"
+        lines = [f"# HELP {name} Duration of the pipeline stages.", f"# TYPE {name} histogram"]
+        with self._lock:
+            histograms = {stage: (list(c), s, n) for stage, (c, s, n) in self._histograms.items()}
+        for stage, (counts, total, count) in sorted(histograms.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {total}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+
+        for collector, (kind, documentation, value) in self._collectors.items():
+            lines += [f"# HELP {collector} {documentation}", f"# TYPE {collector} {kind}", f"{collector} {value()}"]
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics(trace_log=os.environ.get("GLIMEPIRIDE_TRACE_LOG"))
@@ -0,0 +1,127 @@
+"""Glimepiride PBPK model and output definitions.
+
+The compiled model state can be persisted to avoid SBML parsing and JIT
+compilation on startup. The state is created via
+```
+cd src
+python -m glimepiride_app.model
+```
+"""
+
+import hashlib
+import logging
+import os
+from functools import cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import roadrunner
+
+logger = logging.getLogger(__name__)
+
+MODEL_PATH = Path(__file__).parent.parent.parent / "model" / "glimepiride_body_flat.xml"
+STATE_DIR: Optional[str] = os.environ.get("GLIMEPIRIDE_STATE_DIR")
+
+# parameters set per patient in the order used for cache keys
+PARAMETERS = ["PODOSE_gli", "BW", "f_cirrhosis", "KI__f_renal_function", "LI__f_cyp2c9"]
+# valid range (lower, upper) per parameter, the ranges of the app inputs and dose finding
+PARAMETER_BOUNDS = {
+    "PODOSE_gli": (0.0, 32.0),  # [mg]
+    "BW": (40.0, 170.0),  # [kg]
+    "f_cirrhosis": (0.0, 0.95),
+    "KI__f_renal_function": (1 / 110, 1.0),
+    "LI__f_cyp2c9": (0.0, 1.0),
+}
+
+SELECTIONS = ["time", "[Cve_gli]", "[Cve_m1]", "[Cve_m2]", "Aurine_m1_m2"]
+UNITS = {
+    "time": "hr",
+    "[Cve_gli]": "µM",
+    "[Cve_m1]": "µM",
+    "[Cve_m2]": "µM",
+    "Aurine_m1_m2": "µmole"
+}
+UNITS_FACTORS = {
+    "time": 1.0/60,
+    "[Cve_gli]": 1000.0,
+    "[Cve_m1]": 1000.0,
+    "[Cve_m2]": 1000.0,
+    "Aurine_m1_m2": 1000.0
+}
+LABELS = {
+    "time": "<b>Time [hr]</b>",
+    "[Cve_gli]": "<b>Glimepiride Plasma [µM]</b>",
+    "[Cve_m1]": "<b>M1 Plasma [µM]</b>",
+    "[Cve_m2]": "<b>M2 Plasma [µM]</b>",
+    "Aurine_m1_m2": "<b>M1 + M2 Urine [µmole]</b>"
+}
+
+
+@cache
+def model_hash(model_path: Path = MODEL_PATH) -> str:
+    """SHA256 of the SBML file, used to invalidate persisted results."""
+    return hashlib.sha256(Path(model_path).read_bytes()).hexdigest()
+
+
+def state_path(state_dir: Path, model_path: Path = MODEL_PATH) -> Path:
+    """Path of the compiled model state for the model file and RoadRunner version."""
+    import roadrunner
+
+    return Path(state_dir) / f"{Path(model_path).stem}_{model_hash(model_path)[:16]}_rr{roadrunner.__version__}.rrstate"
+
+
+def save_state(r: "roadrunner.RoadRunner", state_dir: Path, model_path: Path = MODEL_PATH) -> Path:
+    """Persist the compiled model state, outdated states are removed."""
+    path = state_path(state_dir, model_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    r.saveState(str(tmp_path))
+    os.replace(tmp_path, path)
+    for outdated in path.parent.glob(f"{Path(model_path).stem}_*.rrstate"):
+        if outdated != path:
+            outdated.unlink(missing_ok=True)
+    return path
+
+
+def load_model(model_path: Path = MODEL_PATH, state_dir: Optional[Path] = STATE_DIR) -> "roadrunner.RoadRunner":
+    """Load the model with the output selections of the app.
+
+    If a state directory is given the compiled model state is loaded from
+    the directory or persisted after compilation.
+    """
+    import roadrunner
+
+    if state_dir:
+        path = state_path(state_dir, model_path)
+        if path.exists():
+            r = roadrunner.RoadRunner()
+            try:
+                r.loadState(str(path))
+                r.timeCourseSelections = SELECTIONS
+                return r
+            except RuntimeError as err:
+                logger.warning(f"Model state '{path}' could not be loaded: {err}")
+
+    r: "roadrunner.RoadRunner" = roadrunner.RoadRunner(str(model_path))
+    r.timeCourseSelections = SELECTIONS
+    if state_dir:
+        try:
+            save_state(r, state_dir, model_path)
+        except (OSError, RuntimeError) as err:
+            logger.warning(f"Model state could not be saved to '{state_dir}': {err}")
+    return r
+
+
+if __name__ == "__main__":
+    import argparse
+    import roadrunner
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(description="Persist the compiled glimepiride model state.")
+    parser.add_argument("--output", type=Path, default=STATE_DIR, required=STATE_DIR is None, help="state directory")
+    args = parser.parse_args()
+    r = roadrunner.RoadRunner(str(MODEL_PATH))
+    r.timeCourseSelections = SELECTIONS
+    path = save_state(r, args.output)
+    logger.info(f"Model state written to '{path}'")
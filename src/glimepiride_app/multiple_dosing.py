@@ -0,0 +1,235 @@
+"""Multiple dosing and periodic steady state.
+
+Doses are given at the start of every dosing interval by adding the dose to
+the oral dose `PODOSE_gli`. For the trajectory, intervals are integrated one
+after another until the trough concentrations of two consecutive intervals
+agree within the tolerance; the remaining intervals repeat the last interval
+with the cumulative urinary excretion continued.
+
+Because of slowly equilibrating compartments, the periodic steady state is
+reached only after months of daily dosing. Instead of integrating all dosing
+intervals, the steady state is solved directly as fixed point of the
+interval map (state at the trough -> state at the next trough) by Newton
+iterations with a finite-difference Jacobian (shooting method).
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from glimepiride_app.metrics import metrics
+from glimepiride_app.model import PARAMETERS, SELECTIONS
+from glimepiride_app.pk import SUBSTANCES
+from glimepiride_app.pool import roadrunner_pool
+from glimepiride_app.simulation import END, STEPS, simulation_cache, to_dataframe
+from glimepiride_app.solver import PROFILES, use_profile
+
+if TYPE_CHECKING:
+    import roadrunner
+
+# dosing regimen parameters in addition to the model parameters
+REGIMEN = ["doses", "interval"]  # [-], [hr]
+DEFAULT_REGIMEN = {"doses": 1, "interval": 24.0}
+# cumulative outputs, continued over repeated intervals
+CUMULATIVE = ["Aurine_m1_m2"]
+# finite differences of the Newton iterations require tight integrator tolerances
+STEADY_STATE_PROFILE = PROFILES["default"]
+
+
+def is_multiple_dosing(parameters: Dict[str, float]) -> bool:
+    """Parameters with more than one dose."""
+    return int(parameters.get("doses", 1)) > 1
+
+
+def _steps(interval: float) -> int:
+    # time resolution of the single dose simulation
+    return max(int(round(STEPS * interval / END)), 1)
+
+
+def _dose(r: "roadrunner.RoadRunner", dose: float) -> None:
+    r.setValue("PODOSE_gli", r.getValue("PODOSE_gli") + dose)
+
+
+def simulate_multiple_dosing(
+    r: "roadrunner.RoadRunner", parameters: Dict[str, float], tolerance: float = 1e-3
+) -> Tuple[pd.DataFrame, int]:
+    """Simulate repeated doses with early stop at the periodic steady state.
+
+    Results are converted to the display units (hr, µM, µmole), the time
+    resolution is the one of the single dose simulation.
+
+    :param parameters: model parameters with dose `PODOSE_gli` [mg] per
+        administration, number of `doses` and dosing `interval` [hr]
+    :param tolerance: maximal relative change of the trough concentrations
+    :return: tuple (results, number of integrated intervals)
+    """
+    doses = int(parameters["doses"])
+    interval = 60 * float(parameters["interval"])  # [min]
+    steps = _steps(interval)
+    concentrations = [SELECTIONS.index(column) for column, _ in SUBSTANCES.values()]
+
+    r.resetAll()
+    for pid in PARAMETERS:
+        r.setValue(pid, parameters[pid])
+    segments = []
+    with metrics.span("integrate"):
+        for k in range(doses):
+            if k > 0:
+                _dose(r, parameters["PODOSE_gli"])
+            s = np.array(r.simulate(start=k * interval, end=(k + 1) * interval, steps=steps))
+            segments.append(s if k == 0 else s[1:])
+            if k > 0:
+                trough, previous = s[-1, concentrations], segments[-2][-1, concentrations]
+                if np.all(np.abs(trough - previous) <= tolerance * np.maximum(s[:, concentrations].max(axis=0), 1e-12)):
+                    break
+
+    intervals = len(segments)
+    if intervals < doses:
+        # periodic continuation of the steady-state interval
+        last = segments[-1]
+        cumulative = [SELECTIONS.index(column) for column in CUMULATIVE]
+        increment = np.zeros(len(SELECTIONS))
+        increment[0] = interval
+        increment[cumulative] = last[-1, cumulative] - segments[-2][-1, cumulative]
+        for j in range(1, doses - intervals + 1):
+            segments.append(last + j * increment)
+
+    with metrics.span("to_dataframe"):
+        return to_dataframe(np.concatenate(segments), SELECTIONS), intervals
+
+
+def _state_ids(r: "roadrunner.RoadRunner") -> List[str]:
+    """Independent state of the interval map, i.e. without excreted amounts."""
+    rules = set(r.getAssignmentRuleIds())
+    species = [
+        sid for sid in r.model.getFloatingSpeciesIds()
+        if sid not in rules and not sid.startswith(("Aurine", "Afeces"))
+    ]
+    return ["PODOSE_gli"] + species
+
+
+def periodic_steady_state(
+    r: "roadrunner.RoadRunner", parameters: Dict[str, float], tolerance: float = 1e-3, max_iterations: int = 8
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """First dosing interval and dosing interval at the periodic steady state.
+
+    Starting from the trough after three doses, damped Newton iterations
+    solve x = F(x) for the trough state x with the interval map F. Iterations
+    stop if the trough concentrations of glimepiride, M1 and M2 change less
+    than the tolerance over one interval.
+
+    :param parameters: model parameters with dose `PODOSE_gli` [mg] per
+        administration and dosing `interval` [hr]
+    :return: tuple (first interval, steady-state interval), results (hr, µM,
+        µmole) starting at time 0
+    """
+    interval = 60 * float(parameters["interval"])  # [min]
+    dose = float(parameters["PODOSE_gli"])
+    ids = _state_ids(r)
+    concentrations = [ids.index(column[1:-1]) for column, _ in SUBSTANCES.values()]
+
+    def start(x: np.ndarray) -> None:
+        r.resetAll()
+        for pid in PARAMETERS:
+            r.setValue(pid, parameters[pid])
+        r.setValue("PODOSE_gli", 0.0)
+        for sid, value in zip(ids, x):
+            r.setValue(sid, value)
+        _dose(r, dose)
+
+    def interval_map(x: np.ndarray) -> np.ndarray:
+        start(x)
+        r.simulate(start=0, end=interval, steps=1)
+        return np.array([r.getValue(sid) for sid in ids])
+
+    with metrics.span("steady_state"), use_profile(r, STEADY_STATE_PROFILE):
+        start(np.zeros(len(ids)))
+        first = np.array(r.simulate(start=0, end=interval, steps=_steps(interval)))
+        x = np.array([r.getValue(sid) for sid in ids])
+        for _ in range(2):
+            x = interval_map(x)
+        # scaled residual as merit function of the line search
+        weights = np.maximum(np.abs(x), 1e-6 * max(np.abs(x).max(), 1e-12))
+        f = interval_map(x) - x
+        for _ in range(max_iterations):
+            c, fc = x[concentrations], f[concentrations]
+            if np.all(np.abs(fc) <= tolerance * np.maximum(np.abs(c + fc), 1e-6 * np.abs(c).max())):
+                break
+            # finite-difference Jacobian of the residual F(x) - x, the relative
+            # step is well above the integrator tolerances
+            jacobian = np.empty((len(x), len(x)))
+            for j in range(len(x)):
+                h = 1e-3 * weights[j]
+                xh = x.copy()
+                xh[j] += h
+                jacobian[:, j] = (interval_map(xh) - xh - f) / h
+            dx = np.linalg.solve(jacobian, -f)
+
+            merit = np.abs(f / weights).max()
+            for alpha in (1.0, 0.5, 0.25, 0.125):
+                xn = np.maximum(x + alpha * dx, 0.0)
+                try:
+                    fn = interval_map(xn) - xn
+                except RuntimeError:
+                    continue
+                if np.abs(fn / weights).max() < merit:
+                    x, f = xn, fn
+                    break
+            else:
+                # no descent, continue with fixed-point iteration
+                x = x + f
+                f = interval_map(x) - x
+
+        start(x)
+        s = np.array(r.simulate(start=0, end=interval, steps=_steps(interval)))
+    return to_dataframe(first, SELECTIONS), to_dataframe(s, SELECTIONS)
+
+
+@dataclass
+class SteadyStatePK:
+    """Pharmacokinetic parameters of the dosing interval at steady state."""
+
+    cmax: float
+    cmin: float
+    auctau: float
+    # AUCtau,ss / AUC(0-tau) of the first dose
+    accumulation: float
+
+
+def _auc(df: pd.DataFrame, column: str) -> float:
+    t, c = df["time"].to_numpy(), df[column].to_numpy()
+    return float(np.sum((t[1:] - t[:-1]) * (c[1:] + c[:-1]) / 2.0))
+
+
+def steady_state_pk(first: pd.DataFrame, df: pd.DataFrame) -> Dict[str, SteadyStatePK]:
+    """Cmax,ss, Cmin,ss, AUCtau,ss and accumulation ratio of glimepiride, M1 and M2.
+
+    :param first: first dosing interval with time [hr] and concentrations [µM]
+    :param df: steady-state dosing interval with time [hr] and concentrations [µM]
+    """
+    results = {}
+    for substance, (column, _) in SUBSTANCES.items():
+        c = df[column].to_numpy()
+        auctau, auc_first = _auc(df, column), _auc(first, column)
+        results[substance] = SteadyStatePK(
+            cmax=float(c.max()),
+            cmin=float(c.min()),
+            auctau=auctau,
+            accumulation=auctau / auc_first if auc_first > 0 else float("nan"),
+        )
+    return results
+
+
+@lru_cache(maxsize=256)
+def _steady_state_pk(key: Tuple[float, ...], interval: float) -> Dict[str, SteadyStatePK]:
+    parameters = {**dict(zip(PARAMETERS, key)), "interval": interval}
+    with roadrunner_pool.checkout() as r:
+        return steady_state_pk(*periodic_steady_state(r, parameters))
+
+
+def steady_state_patient(parameters: Dict[str, float]) -> Dict[str, SteadyStatePK]:
+    """Steady-state PK parameters for the patient and dosing interval, cached."""
+    return _steady_state_pk(simulation_cache.key(parameters), float(parameters["interval"]))
@@ -0,0 +1,122 @@
+"""Example patients and conversion to model parameters."""
+
+from typing import Dict
+
+NORMAL_CRCL = 110.0  # [mL/min]
+
+PREDEFINED_PATIENTS: Dict[str, Dict[str, float]] = {
+    # Cirrhosis patients
+    "CPT A": {
+        "dose": 4.0,
+        "weight": 75.0,
+        "crcl": 110.0,
+        "cirrhosis": 0.3994897959183674,
+        "allele1": 100,
+        "allele2": 100,
+    },
+    "CPT B": {
+        "dose": 4.0,
+        "weight": 75.0,
+        "crcl": 110.0,
+        "cirrhosis": 0.6979591836734694,
+        "allele1": 100,
+        "allele2": 100,
+    },
+    "CPT C": {
+        "dose": 4.0,
+        "weight": 75.0,
+        "crcl": 110.0,
+        "cirrhosis": 0.8127551020408164,
+        "allele1": 100,
+        "allele2": 100,
+    },
+    # Kidney impairment patients
+    "Mild Renal Impairment": {
+        "dose": 4.0,
+        "weight": 75.0,
+        "crcl": 75.9,  # 110 * 0.69
+        "cirrhosis": 0,
+        "allele1": 100,
+        "allele2": 100,
+    },
+    "Moderate Renal Impairment": {
+        "dose": 4.0,
+        "weight": 75.0,
+        "crcl": 35.2,  # 110 * 0.32
+        "cirrhosis": 0,
+        "allele1": 100,
+        "allele2": 100,
+    },
+    "Severe Renal Impairment": {
+        "dose": 4.0,
+        "weight": 75.0,
+        "crcl": 20.9,  # 110 * 0.19
+        "cirrhosis": 0,
+        "allele1": 100,
+        "allele2": 100,
+    },
+    # CYP2C9 genotype
+    "CYP2C9 *1/*1": {
+        "dose": 4.0,
+        "weight": 75.0,
+        "crcl": 110.0,
+        "cirrhosis": 0,
+        "allele1": 100,
+        "allele2": 100,
+    },
+    "CYP2C9 *1/*2": {
+        "dose": 4.0,
+        "weight": 75.0,
+        "crcl": 110.0,
+        "cirrhosis": 0,
+        "allele1": 100,
+        "allele2": 63,
+    },
+    "CYP2C9 *1/*3": {
+        "dose": 4.0,
+        "weight": 75.0,
+        "crcl": 110.0,
+        "cirrhosis": 0,
+        "allele1": 100,
+        "allele2": 23,
+    },
+    "CYP2C9 *2/*2": {
+        "dose": 4.0,
+        "weight": 75.0,
+        "crcl": 110.0,
+        "cirrhosis": 0,
+        "allele1": 63,
+        "allele2": 63,
+    },
+    "CYP2C9 *2/*3": {
+        "dose": 4.0,
+        "weight": 75.0,
+        "crcl": 110.0,
+        "cirrhosis": 0,
+        "allele1": 63,
+        "allele2": 23,
+    },
+    "CYP2C9 *3/*3": {
+        "dose": 4.0,
+        "weight": 75.0,
+        "crcl": 110.0,
+        "cirrhosis": 0,
+        "allele1": 23,
+        "allele2": 23,
+    },
+}
+
+
+def patient_parameters(patient: Dict[str, float]) -> Dict[str, float]:
+    """Model parameters for a patient in the format of the example patients.
+
+    The renal function is the creatinine clearance relative to normal, the
+    CYP2C9 activity the mean activity of both alleles.
+    """
+    return {
+        "PODOSE_gli": patient["dose"],  # [mg]
+        "BW": patient["weight"],  # [kg]
+        "f_cirrhosis": patient["cirrhosis"],
+        "KI__f_renal_function": min(patient["crcl"] / NORMAL_CRCL, 1.0),
+        "LI__f_cyp2c9": (patient["allele1"] + patient["allele2"]) / 2.0 / 100.0,
+    }
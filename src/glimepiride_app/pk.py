@@ -0,0 +1,153 @@
+"""Pharmacokinetic parameters from simulated timecourses.
+
+NumPy implementation of the parameters of
+`pkdb_analysis.pk.pharmacokinetics.TimecoursePK` used in the app. Inputs and
+results are plain floats in the units of the timecourse, i.e., time [hr] and
+concentration [µM] give cmax [µM], tmax [hr], auc [µM*hr] and thalf [hr].
+"""
+
+from dataclasses import dataclass
+from functools import cache
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+# substance: (column, min_threshold) as used in the app
+SUBSTANCES = {
+    "Glimepiride": ("[Cve_gli]", 100),
+    "M1": ("[Cve_m1]", 1e6),
+    "M2": ("[Cve_m2]", 1e6),
+}
+
+
+@dataclass
+class PKParameters:
+    """Pharmacokinetic parameters of a single timecourse."""
+
+    cmax: float
+    tmax: float
+    auc: float
+    aucinf: float
+    kel: float
+    thalf: float
+
+
+def _nan_parameters() -> PKParameters:
+    return PKParameters(*[np.nan] * 6)
+
+
+def pk_parameters(t: np.ndarray, c: np.ndarray, min_threshold: float = 1e6) -> PKParameters:
+    """Calculate pharmacokinetic parameters.
+
+    Concentrations smaller than cmax/min_threshold are excluded. AUC is
+    calculated via the trapezoid rule, the elimination rate via linear
+    regression of the log concentrations after the maximum. aucinf is
+    extrapolated to infinity with the elimination rate.
+
+    :param t: time
+    :param c: concentration (not modified)
+    :param min_threshold: threshold for excluding small concentrations
+    """
+    # maximum is never excluded by the threshold
+    cmax = c.max()
+    if np.isnan(cmax):
+        if np.all(np.isnan(c)):
+            return _nan_parameters()
+        max_idx = int(np.nanargmax(c))
+        cmax = c[max_idx]
+        valid = ~np.isnan(c)
+    else:
+        max_idx = int(c.argmax())
+        valid = np.ones(c.shape, dtype=bool)
+
+    cmin = np.min(c, where=valid & (c != 0), initial=np.inf)
+    if np.isinf(cmin):
+        return _nan_parameters()
+    if min_threshold * cmin < cmax:
+        valid &= c * min_threshold >= cmax
+
+    tv, cv = t[valid], c[valid]
+    auc = float(np.sum((tv[1:] - tv[:-1]) * (cv[1:] + cv[:-1]) / 2.0))
+    tmax = float(t[max_idx])
+
+    # regression on all data points after the maximum
+    slope = np.nan
+    if max_idx <= len(c) - 4:
+        after = valid[max_idx + 1:]
+        x = t[max_idx + 1:][after]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            y = np.log(c[max_idx + 1:][after])
+        if x.size > 1:
+            dx = x - x.mean()
+            with np.errstate(divide="ignore", invalid="ignore"):
+                slope = float(np.dot(dx, y - y.mean()) / np.dot(dx, dx))
+        if slope > 0.0:
+            slope = np.nan
+
+    kel = -slope
+    with np.errstate(divide="ignore", invalid="ignore"):
+        thalf = np.log(2) / kel
+        aucinf = auc - cv[-1] / slope
+
+    return PKParameters(
+        cmax=float(cmax),
+        tmax=tmax,
+        auc=auc,
+        aucinf=float(aucinf),
+        kel=float(kel),
+        thalf=float(thalf),
+    )
+
+
+def pk_table(df: pd.DataFrame) -> Dict[str, PKParameters]:
+    """Pharmacokinetic parameters of glimepiride, M1 and M2.
+
+    :param df: simulation results with time [hr] and concentrations [µM]
+    """
+    t = df["time"].to_numpy()
+    return {
+        substance: pk_parameters(t, df[column].to_numpy(), min_threshold=min_threshold)
+        for substance, (column, min_threshold) in SUBSTANCES.items()
+    }
+
+
+@cache
+def unit_registry():
+    """Shared pint UnitRegistry, created on first use."""
+    from pint import UnitRegistry
+
+    return UnitRegistry()
+
+
+def pk_table_reference(df: pd.DataFrame, dose: Optional[float] = None) -> Dict[str, PKParameters]:
+    """Pharmacokinetic parameters via pkdb_analysis TimecoursePK.
+
+    Slow reference implementation for validation of `pk_table`.
+
+    :param df: simulation results with time [hr] and concentrations [µM]
+    :param dose: glimepiride dose [mg]
+    """
+    from pkdb_analysis.pk.pharmacokinetics import TimecoursePK
+
+    ureg = unit_registry()
+    Q_ = ureg.Quantity
+    results = {}
+    for substance, (column, min_threshold) in SUBSTANCES.items():
+        pk = TimecoursePK(
+            time=Q_(df["time"].to_numpy(), "hour"),
+            concentration=Q_(df[column].to_numpy(copy=True), "micromolar"),
+            dose=Q_(dose, "milligram") if substance == "Glimepiride" and dose is not None else None,
+            ureg=ureg,
+            substance=substance,
+            min_treshold=min_threshold,
+        ).pk
+        results[substance] = PKParameters(
+            cmax=pk.cmax.magnitude,
+            tmax=pk.tmax.magnitude,
+            auc=pk.auc.magnitude,
+            aucinf=pk.aucinf.magnitude,
+            kel=pk.kel.magnitude,
+            thalf=pk.thalf.magnitude,
+        )
+    return results
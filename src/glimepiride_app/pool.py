@@ -0,0 +1,95 @@
+"""Shared pool of RoadRunner instances.
+
+The model is parsed and compiled once per process, further instances are
+cloned from the serialized state of the compiled model. Instances use the
+selected integrator profile (see solver). Sessions check out
+an instance for the duration of a simulation and return it reset.
+"""
+
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator, Optional
+
+from glimepiride_app.metrics import metrics
+from glimepiride_app.model import MODEL_PATH, load_model
+from glimepiride_app.solver import apply_profile, selected_profile
+
+if TYPE_CHECKING:
+    import roadrunner
+
+
+class RoadRunnerPool:
+    """Bounded pool of RoadRunner instances of the glimepiride model."""
+
+    def __init__(self, size: int, model_path: Path = MODEL_PATH):
+        self.size = size
+        self.model_path = model_path
+        self._state: Optional[bytes] = None
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._state_lock = threading.Lock()
+
+    @property
+    def created(self) -> int:
+        """Number of instances created."""
+        return self._created
+
+    def _create(self) -> "roadrunner.RoadRunner":
+        import roadrunner
+
+        with self._state_lock:
+            if self._state is None:
+                r = load_model(self.model_path)
+                self._state = r.saveStateS()
+            else:
+                r = roadrunner.RoadRunner()
+                r.loadStateS(self._state)
+        apply_profile(r, selected_profile())
+        return r
+
+    def _acquire(self, timeout: Optional[float]) -> "roadrunner.RoadRunner":
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if not create:
+            return self._idle.get(timeout=timeout)
+
+        try:
+            return self._create()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    @contextmanager
+    def checkout(self, timeout: Optional[float] = None) -> Iterator["roadrunner.RoadRunner"]:
+        """Check out an instance, blocks until an instance is available.
+
+        :raises queue.Empty: if no instance is available within timeout
+        """
+        r = self._acquire(timeout)
+        try:
+            yield r
+        finally:
+            try:
+                r.resetAll()
+            except RuntimeError:
+                # discard broken instance
+                with self._lock:
+                    self._created -= 1
+            else:
+                self._idle.put(r)
+
+
+roadrunner_pool = RoadRunnerPool(size=int(os.environ.get("GLIMEPIRIDE_POOL_SIZE", os.cpu_count() or 1)))
+metrics.register("pool_instances", "gauge", "RoadRunner instances created.", lambda: roadrunner_pool.created)
@@ -0,0 +1,310 @@
+"""Population variability bands via Monte Carlo replicates.
+
+Replicates are sampled around a patient (BW, renal function, cirrhosis,
+CYP2C9 activity), simulated in worker processes and reduced to 5/50/95 %
+bands per time point with streaming P² quantile estimates (Jain & Chlamtac,
+1985), i.e., replicates are not kept in memory. Bands can be read after every
+completed chunk of replicates and refine as the run proceeds. Replicates with
+failing simulations are counted and left out of the bands.
+"""
+
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from itertools import islice
+from multiprocessing import get_context
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from glimepiride_app.model import PARAMETERS, SELECTIONS, load_model
+from glimepiride_app.simulation import END, START
+
+QUANTILES = (0.05, 0.5, 0.95)
+# replicates per population run
+REPLICATES = int(os.environ.get("GLIMEPIRIDE_POPULATION_REPLICATES", 200))
+# seed of the replicate sampling, the bands of a patient are reproducible
+SEED = int(os.environ.get("GLIMEPIRIDE_POPULATION_SEED", 0))
+# time resolution of the replicates
+BAND_STEPS = 500
+
+# parameter: (distribution, variability, lower bound, upper bound)
+# lognormal variability is the coefficient of variation, normal the standard deviation
+VARIABILITY: Dict[str, Tuple[str, float, float, float]] = {
+    "BW": ("lognormal", 0.15, 40.0, 170.0),  # [kg]
+    "f_cirrhosis": ("normal", 0.05, 0.0, 0.95),
+    "KI__f_renal_function": ("lognormal", 0.2, 1 / 110, 1.0),
+    "LI__f_cyp2c9": ("lognormal", 0.25, 0.0, 1.0),
+}
+
+
+def sample_patients(
+    parameters: Dict[str, float], n: int, seed: Optional[int] = None
+) -> List[Dict[str, float]]:
+    """Replicates of the patient with the parameter variability (VARIABILITY).
+
+    Lognormal parameters are sampled with the patient value as median.
+    """
+    rng = np.random.default_rng(seed)
+    samples = {pid: np.full(n, float(parameters[pid])) for pid in PARAMETERS}
+    for pid, (distribution, variability, lower, upper) in VARIABILITY.items():
+        if distribution == "lognormal":
+            sigma = np.sqrt(np.log1p(variability ** 2))
+            values = samples[pid] * rng.lognormal(0.0, sigma, n)
+        else:
+            values = samples[pid] + rng.normal(0.0, variability, n)
+        samples[pid] = np.clip(values, lower, upper)
+    return [{pid: float(samples[pid][k]) for pid in PARAMETERS} for k in range(n)]
+
+
+class StreamingQuantiles:
+    """P² estimates of quantiles per element of a stream of arrays.
+
+    Every quantile is tracked by five markers per element, the update is
+    vectorized over all elements. Memory is independent of the number of
+    observations.
+    """
+
+    def __init__(self, quantiles: Sequence[float], shape: Tuple[int, ...]):
+        self.quantiles = np.asarray(quantiles, dtype=float)
+        self.shape = shape
+        self.count = 0
+        size = int(np.prod(shape))
+        p = self.quantiles[:, None]
+        # marker heights and positions (quantile, marker, element)
+        self._q = np.empty((len(self.quantiles), 5, size))
+        self._n = np.tile(np.arange(5.0)[None, :, None], (len(self.quantiles), 1, size))
+        # desired marker positions and their increments per observation
+        self._desired = np.hstack([np.zeros_like(p), 2 * p, 4 * p, 2 + 2 * p, np.full_like(p, 4)])
+        self._increment = np.hstack([np.zeros_like(p), p / 2, p, (1 + p) / 2, np.ones_like(p)])
+
+    def update(self, x: np.ndarray) -> None:
+        """Add an observation with the shape of the stream."""
+        x = np.asarray(x, dtype=float).reshape(-1)
+        q, n = self._q, self._n
+        if self.count < 5:
+            q[:, self.count] = x
+            self.count += 1
+            if self.count == 5:
+                q.sort(axis=1)
+            return
+
+        self.count += 1
+        np.minimum(q[:, 0], x, out=q[:, 0])
+        np.maximum(q[:, 4], x, out=q[:, 4])
+        # cell of the observation, markers above are shifted
+        k = np.minimum((x >= q[:, 1:]).sum(axis=1), 3)
+        n += np.arange(5)[None, :, None] > k[:, None, :]
+        self._desired += self._increment
+
+        for i in (1, 2, 3):
+            d = self._desired[:, i, None] - n[:, i]
+            move = ((d >= 1) & (n[:, i + 1] - n[:, i] > 1)) | ((d <= -1) & (n[:, i - 1] - n[:, i] < -1))
+            if not move.any():
+                continue
+            s = np.where(d >= 0, 1.0, -1.0)
+            # piecewise-parabolic prediction, linear if not monotone
+            parabolic = q[:, i] + s / (n[:, i + 1] - n[:, i - 1]) * (
+                (n[:, i] - n[:, i - 1] + s) * (q[:, i + 1] - q[:, i]) / (n[:, i + 1] - n[:, i])
+                + (n[:, i + 1] - n[:, i] - s) * (q[:, i] - q[:, i - 1]) / (n[:, i] - n[:, i - 1])
+            )
+            j = np.where(s > 0, i + 1, i - 1)
+            qj = np.take_along_axis(q, j[:, None, :], axis=1)[:, 0]
+            nj = np.take_along_axis(n, j[:, None, :], axis=1)[:, 0]
+            linear = q[:, i] + s * (qj - q[:, i]) / (nj - n[:, i])
+            height = np.where((q[:, i - 1] < parabolic) & (parabolic < q[:, i + 1]), parabolic, linear)
+            q[:, i] = np.where(move, height, q[:, i])
+            n[:, i] += np.where(move, s, 0.0)
+
+    def result(self) -> np.ndarray:
+        """Quantile estimates with shape (quantiles, *shape)."""
+        if self.count == 0:
+            return np.full((len(self.quantiles),) + self.shape, np.nan)
+        if self.count < 5:
+            values = np.quantile(self._q[0, :self.count], self.quantiles, axis=0)
+        else:
+            values = self._q[:, 2]
+        return values.reshape((len(self.quantiles),) + self.shape)
+
+
+_r = None
+
+
+def _init_worker(state: bytes) -> None:
+    import roadrunner
+
+    from glimepiride_app.solver import apply_profile, selected_profile
+
+    global _r
+    _r = roadrunner.RoadRunner()
+    _r.loadStateS(state)
+    apply_profile(_r, selected_profile())
+
+
+def _simulate_replicates(chunk: List[Dict[str, float]], steps: int) -> List[Optional[np.ndarray]]:
+    from glimepiride_app.simulation import simulate
+
+    results = []
+    for parameters in chunk:
+        try:
+            results.append(simulate(_r, parameters, steps=steps)[SELECTIONS[1:]].to_numpy(dtype=np.float32).T)
+        except RuntimeError:
+            # integrator failure, only the replicate is lost
+            results.append(None)
+    return results
+
+
+def _simulate_patients(chunk: List[Dict[str, float]], output: str) -> List[np.ndarray]:
+    from glimepiride_app.simulation import simulate
+
+    return [simulate(_r, parameters, output=output)[SELECTIONS].to_numpy() for parameters in chunk]
+
+
+class PopulationSimulator:
+    """Persistent pool of worker processes for replicate simulations."""
+
+    def __init__(self, processes: Optional[int] = None, chunksize: int = 10, steps: int = BAND_STEPS):
+        """Create simulator, workers are started on first use.
+
+        :param processes: number of worker processes (default: number of CPUs)
+        :param chunksize: replicates per task
+        :param steps: number of time steps of the replicates
+        """
+        self.processes = processes or os.cpu_count() or 1
+        self.chunksize = chunksize
+        self.steps = steps
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def time(self) -> np.ndarray:
+        """Time points of the replicates [hr]."""
+        return np.linspace(START, END, self.steps + 1) / 60
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(load_model().saveStateS(),),
+                )
+            return self._executor
+
+    def iter_chunks(self, patients: List[Dict[str, float]]) -> Iterator[List[Optional[np.ndarray]]]:
+        """Simulate all patients, chunks of trajectories (outputs, time) are yielded in completion order.
+
+        Trajectories of failed simulations are None. Chunks in flight are
+        cancelled if the iterator is closed.
+        """
+        executor = self._get_executor()
+        items = iter(patients)
+        chunks = iter(lambda: list(islice(items, self.chunksize)), [])
+        pending = {executor.submit(_simulate_replicates, chunk, self.steps) for chunk in islice(chunks, 2 * self.processes)}
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk = next(chunks, None)
+                    if chunk:
+                        pending.add(executor.submit(_simulate_replicates, chunk, self.steps))
+                    yield future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def simulate(self, patients: List[Dict[str, float]], output: str = "uniform") -> List[np.ndarray]:
+        """Full simulations (SELECTIONS, display units) of the patients in parallel, in order of the patients.
+
+        :param output: output mode of the simulations, see `simulate`
+        """
+        executor = self._get_executor()
+        # one task per worker
+        size = max(-(-len(patients) // self.processes), 1)
+        futures = [
+            executor.submit(_simulate_patients, patients[k:k + size], output) for k in range(0, len(patients), size)
+        ]
+        return [data for future in futures for data in future.result()]
+
+
+population_simulator = PopulationSimulator(
+    processes=int(os.environ.get("GLIMEPIRIDE_POPULATION_PROCESSES", 0)) or None,
+)
+# separate workers for the sensitivity simulations, which are not queued
+# behind the chunks of a population run
+sensitivity_simulator = PopulationSimulator(
+    processes=int(os.environ.get("GLIMEPIRIDE_SENSITIVITY_PROCESSES", 0)) or None,
+)
+
+
+@dataclass
+class PopulationBands:
+    """Quantiles of the replicates per output."""
+
+    time: np.ndarray  # [hr]
+    # output: (quantiles, time)
+    values: Dict[str, np.ndarray]
+    quantiles: Tuple[float, ...]
+    count: int
+    replicates: int
+    # replicates with failed simulations, not part of the bands
+    failed: int = 0
+
+
+class PopulationRun:
+    """Replicates around a patient with progressively refined bands."""
+
+    def __init__(
+        self,
+        parameters: Dict[str, float],
+        replicates: int = REPLICATES,
+        seed: Optional[int] = SEED,
+        simulator: PopulationSimulator = population_simulator,
+    ):
+        self.parameters = parameters
+        self.replicates = replicates
+        self.time = simulator.time
+        self.failed = 0
+        self._estimates = StreamingQuantiles(QUANTILES, (len(SELECTIONS) - 1, len(self.time)))
+        self._chunks = simulator.iter_chunks(sample_patients(parameters, replicates, seed=seed))
+
+    @property
+    def count(self) -> int:
+        """Number of completed replicates."""
+        return self._estimates.count
+
+    @property
+    def done(self) -> bool:
+        return self.count + self.failed >= self.replicates
+
+    def advance(self, replicates: Optional[int] = None) -> "PopulationBands":
+        """Add completed replicates, blocks until the next chunk is available.
+
+        :param replicates: minimal number of replicates to add or fail (default: one chunk)
+        """
+        target = self.count + self.failed + (replicates or 1)
+        while self.count + self.failed < min(target, self.replicates):
+            for trajectories in next(self._chunks):
+                if trajectories is None:
+                    self.failed += 1
+                else:
+                    self._estimates.update(trajectories)
+        return self.bands()
+
+    def bands(self) -> PopulationBands:
+        """Current band estimates."""
+        values = self._estimates.result()
+        return PopulationBands(
+            time=self.time,
+            values={column: values[:, k] for k, column in enumerate(SELECTIONS[1:])},
+            quantiles=QUANTILES,
+            count=self.count,
+            replicates=self.replicates,
+            failed=self.failed,
+        )
+
+    def close(self) -> None:
+        """Cancel the remaining replicates."""
+        self._chunks.close()
@@ -0,0 +1,196 @@
+"""Latest-wins scheduling of simulations.
+
+Requests are made per client (e.g. a marimo session). A request which is
+not yet started is replaced by a newer request of the same client, a
+running request whose inputs are already stale completes but its result is
+discarded. Every client therefore converges on its latest parameters with at
+most one stale simulation in between. Clients are created per session with
+`SimulationScheduler.client` and forgotten when the session ends.
+
+For progressive rendering, `preview_patient` provides a fast approximate
+result which is displayed until the full-resolution result is available.
+"""
+
+import contextvars
+import itertools
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, Optional, Set, Tuple
+
+import pandas as pd
+
+from glimepiride_app.grid import simulation_grid
+from glimepiride_app.metrics import metrics
+from glimepiride_app.model import SELECTIONS
+from glimepiride_app.multiple_dosing import is_multiple_dosing, simulate_multiple_dosing
+from glimepiride_app.pool import roadrunner_pool
+from glimepiride_app.simulation import simulate, simulation_cache
+from glimepiride_app.solver import PROFILES, use_profile
+
+# coarse simulation for the preview of the progressive mode
+PREVIEW_STEPS = 250
+PREVIEW_PROFILE = PROFILES["interactive-coarse"]
+
+
+def simulate_patient(parameters: Dict[str, float]) -> pd.DataFrame:
+    """Simulation via grid lookup or cached simulation.
+
+    Multiple doses (parameter `doses` > 1) are simulated directly.
+    Results in [hr], [µM], [µmole].
+    """
+    if is_multiple_dosing(parameters):
+        with roadrunner_pool.checkout() as r:
+            return simulate_multiple_dosing(r, parameters)[0]
+
+    with metrics.span("grid_lookup"):
+        df = simulation_grid.lookup(parameters) if simulation_grid else None
+    if df is None:
+        # RoadRunner instance from the shared pool for the duration of the simulation
+        with roadrunner_pool.checkout() as r:
+            df = simulation_cache.simulate(r, parameters)
+    return df
+
+
+def preview_patient(parameters: Dict[str, float]) -> Tuple[pd.DataFrame, bool]:
+    """Fast preview of the simulation results.
+
+    Exact results are taken from the grid or the cache, otherwise the grid is
+    interpolated without error bound or a coarse simulation with relaxed
+    tolerances is performed.
+
+    :return: tuple (results in [hr], [µM], [µmole], results are exact)
+    """
+    if is_multiple_dosing(parameters):
+        return simulate_patient(parameters), True
+
+    with metrics.span("grid_lookup"):
+        df = simulation_grid.lookup(parameters) if simulation_grid else None
+    if df is None:
+        df = simulation_cache.get(simulation_cache.key(parameters))
+    if df is not None:
+        return df, True
+
+    result = simulation_grid.interpolate(parameters) if simulation_grid else None
+    if result is not None:
+        df = pd.DataFrame(result[0].T, columns=SELECTIONS[1:])
+        df.insert(0, "time", simulation_grid.time)
+        return df, False
+
+    with roadrunner_pool.checkout() as r, use_profile(r, PREVIEW_PROFILE):
+        df = simulate(r, parameters, steps=PREVIEW_STEPS)
+    return df, False
+
+
+@dataclass
+class _Request:
+    generation: int
+    parameters: Dict[str, float]
+    future: Future
+    # context of the submitting thread, e.g. the trace id
+    context: contextvars.Context
+
+
+class SchedulerClient:
+    """Client of the scheduler, e.g. a marimo session.
+
+    Requests are made with the key of the client. The scheduler forgets the
+    client when the handle is garbage collected at the end of the session.
+    """
+
+    def __init__(self, scheduler: "SimulationScheduler", key: int):
+        self.key = key
+        weakref.finalize(self, scheduler.forget, key)
+
+
+class SimulationScheduler:
+    """Coalescing scheduler with superseding of stale requests."""
+
+    def __init__(self, simulate: Callable[[Dict[str, float]], pd.DataFrame] = simulate_patient, workers: int = 1):
+        self._simulate = simulate
+        self._condition = threading.Condition()
+        # latest request per client which is not yet started, FIFO over clients
+        self._pending: OrderedDict[Hashable, _Request] = OrderedDict()
+        self._latest: Dict[Hashable, int] = {}
+        # keys of the clients which are not yet forgotten
+        self._clients: Set[Hashable] = set()
+        self._generations = itertools.count()
+        self._client_keys = itertools.count()
+        self.superseded = 0
+        for _ in range(workers):
+            threading.Thread(target=self._work, daemon=True).start()
+
+    def client(self) -> SchedulerClient:
+        """New client, forgotten when the returned handle is garbage collected."""
+        key = next(self._client_keys)
+        with self._condition:
+            self._clients.add(key)
+        return SchedulerClient(self, key)
+
+    def submit(self, client: Hashable, parameters: Dict[str, float]) -> Future:
+        """Schedule simulation, the future result is None if superseded."""
+        future: Future = Future()
+        with self._condition:
+            generation = next(self._generations)
+            self._latest[client] = generation
+            previous = self._pending.pop(client, None)
+            if previous:
+                previous.future.cancel()
+                self.superseded += 1
+            self._pending[client] = _Request(generation, parameters, future, contextvars.copy_context())
+            self._condition.notify()
+        return future
+
+    def run(self, client: Hashable, parameters: Dict[str, float], timeout: Optional[float] = None) -> Optional[pd.DataFrame]:
+        """Simulate and wait for the result, None if superseded by a newer request."""
+        try:
+            return self.submit(client, parameters).result(timeout)
+        except CancelledError:
+            return None
+
+    def forget(self, client: Hashable) -> None:
+        """Remove client and cancel its queued request, e.g. on session end."""
+        with self._condition:
+            self._latest.pop(client, None)
+            self._clients.discard(client)
+            previous = self._pending.pop(client, None)
+        if previous:
+            previous.future.cancel()
+
+    def active_clients(self) -> int:
+        """Number of clients which are not forgotten, i.e. open sessions."""
+        with self._condition:
+            return len(self._clients)
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                client, request = self._pending.popitem(last=False)
+            if not request.future.set_running_or_notify_cancel():
+                continue
+            try:
+                df = request.context.run(self._simulate, request.parameters)
+            except Exception as err:
+                request.future.set_exception(err)
+                continue
+            with self._condition:
+                stale = self._latest.get(client) != request.generation
+                if stale:
+                    self.superseded += 1
+            request.future.set_result(None if stale else df)
+
+
+simulation_scheduler = SimulationScheduler(
+    workers=int(os.environ.get("GLIMEPIRIDE_POOL_SIZE", os.cpu_count() or 1))
+)
+metrics.register(
+    "active_sessions", "gauge", "Open app sessions.", simulation_scheduler.active_clients
+)
+metrics.register(
+    "superseded_total", "counter", "Simulations superseded by newer parameters.", lambda: simulation_scheduler.superseded
+)
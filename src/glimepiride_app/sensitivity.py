@@ -0,0 +1,95 @@
+"""Local sensitivity of the pharmacokinetic parameters.
+
+Normalized sensitivities S = d ln(PK) / d ln(p) of Cmax and AUC to the
+patient parameters are calculated by central differences in log space with
+the relative perturbation DELTA. Perturbations are clipped to the parameter
+bounds (PARAMETER_BOUNDS), at a bound the difference is one-sided. Without a
+dose the PK parameters are 0 and the sensitivities are undefined. The
+perturbed simulations are run in parallel in dedicated worker processes
+(not shared with the population bands) and stored in the simulation cache,
+i.e., repeated interactions reuse them.
+
+RoadRunner's forward sensitivity solver is not used: the patient parameters
+act via assignment rules and the dose is a rate-rule variable, for which the
+solver returns no sensitivities.
+"""
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from glimepiride_app.metrics import metrics
+from glimepiride_app.model import PARAMETER_BOUNDS, PARAMETERS, SELECTIONS
+from glimepiride_app.pk import pk_table
+from glimepiride_app.population import PopulationSimulator, sensitivity_simulator
+from glimepiride_app.simulation import SimulationCache, resample, simulation_cache
+
+# relative perturbation of the parameters
+DELTA = 0.05
+# pharmacokinetic parameters of the sensitivities
+PK_METRICS = ("cmax", "auc")
+
+
+def perturbations(parameters: Dict[str, float], delta: float = DELTA) -> List[Tuple[str, float, Dict[str, float]]]:
+    """Perturbed parameters (parameter, value, parameters) for the differences, lower and upper point per parameter.
+
+    Perturbations are clipped to PARAMETER_BOUNDS, at a bound the unperturbed
+    value is used (one-sided difference). Parameters with value 0 have no
+    normalized sensitivity and are not perturbed.
+    """
+    items = []
+    for pid in PARAMETERS:
+        value = parameters[pid]
+        if value == 0:
+            continue
+        lower, upper = PARAMETER_BOUNDS[pid]
+        for perturbed in (max(value * (1 - delta), lower), min(value * (1 + delta), upper)):
+            items.append((pid, perturbed, {**parameters, pid: perturbed}))
+    return items
+
+
+def sensitivities(
+    parameters: Dict[str, float],
+    delta: float = DELTA,
+    cache: SimulationCache = simulation_cache,
+    simulator: PopulationSimulator = sensitivity_simulator,
+) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Normalized sensitivities of the PK parameters to the patient parameters.
+
+    :param parameters: patient parameters (PARAMETERS)
+    :param delta: relative perturbation
+    :return: substance -> PK parameter -> parameter -> sensitivity
+    :raises ValueError: without a dose (`PODOSE_gli` 0)
+    """
+    if parameters["PODOSE_gli"] == 0:
+        raise ValueError("Sensitivities are undefined without a dose.")
+    items = perturbations(parameters, delta)
+    keys = [cache.key(p) for _, _, p in items]
+    results = {key: cache.get(key) for key in keys}
+    missing = [key for key, df in results.items() if df is None]
+    if missing:
+        with metrics.span("sensitivity_simulations"):
+            data = simulator.simulate([dict(zip(PARAMETERS, key)) for key in missing], output=cache.output)
+        for key, values in zip(missing, data):
+            results[key] = pd.DataFrame(cache.put(key, pd.DataFrame(values, columns=SELECTIONS)), columns=SELECTIONS)
+
+    with metrics.span("sensitivity_pk"):
+        pks = {key: pk_table(resample(df)) for key, df in results.items()}
+    sens: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for k in range(0, len(items), 2):
+        pid = items[k][0]
+        (_, low, _), (_, high, _) = items[k], items[k + 1]
+        pk_low, pk_high = pks[keys[k]], pks[keys[k + 1]]
+        for substance in pk_low:
+            for name in PK_METRICS:
+                y_low, y_high = getattr(pk_low[substance], name), getattr(pk_high[substance], name)
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    value = (np.log(y_high) - np.log(y_low)) / (np.log(high) - np.log(low))
+                sens.setdefault(substance, {}).setdefault(name, {})[pid] = float(value)
+    # parameters with value 0
+    for substance in sens:
+        for name in PK_METRICS:
+            for pid in PARAMETERS:
+                sens[substance][name].setdefault(pid, 0.0)
+    return sens
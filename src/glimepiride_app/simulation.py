@@ -0,0 +1,249 @@
+"""Simulation of a single patient with a process-wide result cache."""
+
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from glimepiride_app.metrics import metrics
+from glimepiride_app.model import PARAMETERS, SELECTIONS, UNITS_FACTORS, model_hash
+from glimepiride_app.solver import selected_profile
+
+if TYPE_CHECKING:
+    import roadrunner
+
+logger = logging.getLogger(__name__)
+
+START = 0  # [min]
+END = 60 * 50  # [min]
+STEPS = 2500
+
+# output modes: uniform time steps, non-uniform time points or integrator steps
+OUTPUTS = ["uniform", "adaptive", "variable"]
+
+# non-uniform time points [min], dense during absorption and around Tmax
+ADAPTIVE_TIMES = np.unique(np.concatenate([
+    np.arange(0, 60 * 8, 3),  # 0 - 8 hr
+    np.arange(60 * 8, 60 * 25, 15),  # 8 - 25 hr
+    np.arange(60 * 25, END + 1, 60),  # 25 - 50 hr
+])).astype(float)
+
+
+def simulate(
+    r: "roadrunner.RoadRunner", parameters: Dict[str, float], steps: int = STEPS, output: str = "uniform"
+) -> pd.DataFrame:
+    """Simulate a single oral dose for the given patient parameters.
+
+    Results are converted to the display units (hr, µM, µmole).
+
+    :param steps: number of steps for uniform output
+    :param output: output mode, one of OUTPUTS
+    """
+    if output not in OUTPUTS:
+        raise ValueError(f"Unsupported output '{output}', use one of {OUTPUTS}.")
+    with metrics.span("reset"):
+        r.resetAll()
+        for pid in PARAMETERS:
+            r.setValue(pid, parameters[pid])
+    with metrics.span("integrate"):
+        if output == "uniform":
+            s = r.simulate(start=START, end=END, steps=steps)
+        elif output == "adaptive":
+            s = r.simulate(times=ADAPTIVE_TIMES)
+        else:
+            r.integrator.variable_step_size = True
+            try:
+                s = r.simulate(start=START, end=END)
+            finally:
+                r.integrator.variable_step_size = False
+    with metrics.span("to_dataframe"):
+        return to_dataframe(s, s.colnames)
+
+
+def to_dataframe(data: np.ndarray, columns: List[str]) -> pd.DataFrame:
+    """Convert simulation results to display units without copying.
+
+    Unit factors are applied in place in a single broadcasted operation on the
+    simulator output, the DataFrame is a view on the converted buffer.
+    """
+    data = np.asarray(data)
+    data *= np.array([UNITS_FACTORS[col] for col in columns])
+    return pd.DataFrame(data, columns=columns, copy=False)
+
+
+def resample(df: pd.DataFrame, steps: int = STEPS) -> pd.DataFrame:
+    """Linear interpolation of non-uniform results on uniform time steps.
+
+    Pharmacokinetic parameters (e.g. the half-life regression) depend on the
+    sampling density and are calculated on uniform time steps.
+    Uniform results are returned unchanged.
+    """
+    t = df["time"].to_numpy()
+    dt = np.diff(t)
+    if np.allclose(dt, dt[0]):
+        return df
+    time = np.linspace(t[0], t[-1], steps + 1)
+    return pd.DataFrame({col: time if col == "time" else np.interp(time, t, df[col].to_numpy()) for col in df.columns})
+
+
+class SimulationCache:
+    """Size-bounded LRU cache of simulation results.
+
+    Results are keyed on the rounded patient parameters. If a directory is
+    given, results are additionally persisted as `.npy` files so the cache
+    survives restarts and can be shared between processes. The directory is
+    bounded to about `disk_maxsize` files, the least recently used files
+    (modification time, refreshed on every hit) are removed.
+
+    Cached results are stored as read-only arrays, every lookup returns a new
+    DataFrame view on the shared buffer.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 256,
+        directory: Optional[Path] = None,
+        ndigits: int = 6,
+        output: str = "uniform",
+        disk_maxsize: int = 4096,
+    ):
+        self.maxsize = maxsize
+        self.disk_maxsize = disk_maxsize
+        self.output = output
+        self.directory = Path(directory) if directory else None
+        self.ndigits = ndigits
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Tuple[float, ...], np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        # the directory is scanned for eviction every `_evict_interval` writes,
+        # starting with the first write of the process
+        self._evict_interval = max(disk_maxsize // 16, 1)
+        self._writes = self._evict_interval - 1
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+    def key(self, parameters: Dict[str, float]) -> Tuple[float, ...]:
+        """Canonical key for the patient parameters."""
+        return tuple(round(float(parameters[pid]), self.ndigits) + 0.0 for pid in PARAMETERS)
+
+    def _path(self, key: Tuple[float, ...]) -> Path:
+        digest = hashlib.sha256(f"{model_hash()}:{self.output}:{selected_profile().name}:{key}".encode()).hexdigest()
+        return self.directory / f"{digest[:32]}.npy"
+
+    def get(self, key: Tuple[float, ...]) -> Optional[pd.DataFrame]:
+        """Cached result for key or None."""
+        with self._lock:
+            data = self._data.get(key)
+            if data is not None:
+                self._data.move_to_end(key)
+                return pd.DataFrame(data, columns=SELECTIONS, copy=False)
+
+        if self.directory:
+            path = self._path(key)
+            try:
+                data = np.load(path)
+                # recently used files are evicted last
+                os.utime(path)
+            except (OSError, ValueError):
+                return None
+            data = self._insert(key, data)
+            return pd.DataFrame(data, columns=SELECTIONS, copy=False)
+        return None
+
+    def put(self, key: Tuple[float, ...], df: pd.DataFrame) -> np.ndarray:
+        """Store result for key in memory and on disk.
+
+        :return: read-only array of the cached result
+        """
+        data = self._insert(key, df[SELECTIONS].to_numpy())
+        if self.directory:
+            path = self._path(key)
+            # unique per writer, the directory can be shared between containers
+            tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+            try:
+                with open(tmp_path, "wb") as f:
+                    np.save(f, data)
+                os.replace(tmp_path, path)
+            except OSError as err:
+                logger.warning(f"Simulation could not be persisted to '{path}': {err}")
+            with self._lock:
+                self._writes += 1
+                evict = self._writes % self._evict_interval == 0
+            if evict:
+                self.evict()
+        return data
+
+    def evict(self) -> int:
+        """Remove the least recently used files above `disk_maxsize` from the directory.
+
+        Files of other models, output modes or solver profiles are not
+        refreshed and are therefore removed first. The directory can be
+        shared, files removed concurrently by other processes are skipped.
+
+        :return: number of removed files
+        """
+        if not self.directory:
+            return 0
+        files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".npy"):
+                    continue
+                try:
+                    files.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    continue
+        removed = 0
+        for _, path in sorted(files)[:max(len(files) - self.disk_maxsize, 0)]:
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                continue
+        return removed
+
+    def _insert(self, key: Tuple[float, ...], data: np.ndarray) -> np.ndarray:
+        data = data.view()
+        data.flags.writeable = False
+        with self._lock:
+            self._data[key] = data
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return data
+
+    def clear(self) -> None:
+        """Clear the in-memory cache."""
+        with self._lock:
+            self._data.clear()
+
+    def simulate(self, r: "roadrunner.RoadRunner", parameters: Dict[str, float]) -> pd.DataFrame:
+        """Cached `simulate`."""
+        key = self.key(parameters)
+        df = self.get(key)
+        if df is not None:
+            self.hits += 1
+            return df
+
+        self.misses += 1
+        df = simulate(r, dict(zip(PARAMETERS, key)), output=self.output)
+        data = self.put(key, df)
+        return pd.DataFrame(data, columns=SELECTIONS, copy=False)
+
+
+simulation_cache = SimulationCache(
+    maxsize=int(os.environ.get("GLIMEPIRIDE_CACHE_SIZE", 256)),
+    directory=os.environ.get("GLIMEPIRIDE_CACHE_DIR"),
+    output=os.environ.get("GLIMEPIRIDE_OUTPUT", "uniform"),
+    disk_maxsize=int(os.environ.get("GLIMEPIRIDE_CACHE_DISK_SIZE", 4096)),
+)
+metrics.register("cache_hits_total", "counter", "Simulation cache hits.", lambda: simulation_cache.hits)
+metrics.register("cache_misses_total", "counter", "Simulation cache misses.", lambda: simulation_cache.misses)
@@ -0,0 +1,172 @@
+"""Integrator profiles and automatic profile selection.
+
+A profile sets the integrator, the tolerances and the maximal time step. All
+profiles use the stiff (BDF) method, the non-stiff (Adams) method exceeds the
+maximal number of steps within the first minute of a simulation. Profiles are
+checked against the reference profile on the example patients
+```
+cd src
+python -m glimepiride_app.solver --bound 0.001
+```
+and the fastest profile with a maximal relative PK error (Cmax, AUC,
+half-life) within the bound is selected. Instances of the RoadRunner pool use
+the profile of env GLIMEPIRIDE_SOLVER_PROFILE, `auto` runs the selection on
+first use.
+"""
+
+import argparse
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import roadrunner
+
+
+@dataclass(frozen=True)
+class SolverProfile:
+    """Integrator settings."""
+
+    name: str
+    relative_tolerance: float
+    absolute_tolerance: float
+    # 0: no limit [min]
+    maximum_time_step: float = 0.0
+    stiff: bool = True
+    integrator: str = "cvode"
+
+
+# profiles from fastest to most accurate
+PROFILES: Dict[str, SolverProfile] = {p.name: p for p in [
+    SolverProfile("interactive-coarse", relative_tolerance=1e-3, absolute_tolerance=1e-6),
+    SolverProfile("interactive-fast", relative_tolerance=1e-4, absolute_tolerance=1e-8),
+    SolverProfile("default", relative_tolerance=1e-6, absolute_tolerance=1e-12),
+    SolverProfile(
+        "publication-accurate", relative_tolerance=1e-10, absolute_tolerance=1e-14, maximum_time_step=5.0
+    ),
+]}
+REFERENCE_PROFILE = "publication-accurate"
+# pharmacokinetic parameters compared against the reference
+PK_FIELDS = ("cmax", "auc", "thalf")
+# maximal relative PK error of the selected profile
+ERROR_BOUND = 1e-3
+
+
+def apply_profile(r: "roadrunner.RoadRunner", profile: SolverProfile) -> None:
+    """Set integrator and settings of the profile."""
+    if r.getIntegrator().getName() != profile.integrator:
+        r.setIntegrator(profile.integrator)
+    r.integrator.relative_tolerance = profile.relative_tolerance
+    r.integrator.absolute_tolerance = profile.absolute_tolerance
+    r.integrator.maximum_time_step = profile.maximum_time_step
+    r.integrator.stiff = profile.stiff
+
+
+@contextmanager
+def use_profile(r: "roadrunner.RoadRunner", profile: SolverProfile) -> Iterator[None]:
+    """Apply the profile within the context, the previous settings are restored."""
+    previous = SolverProfile(
+        name="previous",
+        relative_tolerance=r.integrator.relative_tolerance,
+        absolute_tolerance=r.integrator.absolute_tolerance,
+        maximum_time_step=r.integrator.maximum_time_step,
+        stiff=r.integrator.stiff,
+        integrator=r.getIntegrator().getName(),
+    )
+    apply_profile(r, profile)
+    try:
+        yield
+    finally:
+        apply_profile(r, previous)
+
+
+def pk_error(pk, reference) -> float:
+    """Maximal relative deviation of the PK parameters from the reference.
+
+    :param pk: PK parameters per substance (see pk_table)
+    :param reference: reference PK parameters per substance
+    """
+    errors = [0.0]
+    for substance, ref in reference.items():
+        for field in PK_FIELDS:
+            value, ref_value = getattr(pk[substance], field), getattr(ref, field)
+            if np.isfinite(ref_value) and ref_value != 0:
+                errors.append(abs(value / ref_value - 1.0) if np.isfinite(value) else np.inf)
+    return float(max(errors))
+
+
+def autotune(
+    bound: float = ERROR_BOUND,
+    profiles: Optional[List[SolverProfile]] = None,
+    repeat: int = 3,
+    r: Optional["roadrunner.RoadRunner"] = None,
+) -> Tuple[SolverProfile, Dict[str, Tuple[float, float]]]:
+    """Fastest profile within the PK error bound on the example patients.
+
+    Profiles which fail to integrate a patient (e.g. non-stiff methods) have
+    infinite error. Falls back to the reference profile.
+
+    :param bound: maximal relative PK error
+    :param repeat: repetitions of the timing, the best time is used
+    :return: tuple (selected profile, (error, time [s]) per profile)
+    """
+    from glimepiride_app.model import load_model
+    from glimepiride_app.patients import PREDEFINED_PATIENTS, patient_parameters
+    from glimepiride_app.pk import pk_table
+    from glimepiride_app.simulation import simulate
+
+    profiles = profiles or list(PROFILES.values())
+    r = r or load_model()
+    patients = [patient_parameters(patient) for patient in PREDEFINED_PATIENTS.values()]
+
+    def run(profile: SolverProfile) -> Tuple[list, float]:
+        apply_profile(r, profile)
+        best = np.inf
+        for _ in range(repeat):
+            start = time.perf_counter()
+            results = [pk_table(simulate(r, parameters)) for parameters in patients]
+            best = min(best, time.perf_counter() - start)
+        return results, best
+
+    reference, _ = run(PROFILES[REFERENCE_PROFILE])
+    results = {}
+    for profile in profiles:
+        try:
+            pks, seconds = run(profile)
+        except RuntimeError:
+            results[profile.name] = (np.inf, np.inf)
+            continue
+        results[profile.name] = (max(pk_error(pk, ref) for pk, ref in zip(pks, reference)), seconds)
+
+    valid = [p for p in profiles if results[p.name][0] <= bound]
+    selected = min(valid, key=lambda p: results[p.name][1]) if valid else PROFILES[REFERENCE_PROFILE]
+    return selected, results
+
+
+@lru_cache(maxsize=None)
+def selected_profile() -> SolverProfile:
+    """Profile of env GLIMEPIRIDE_SOLVER_PROFILE (default interactive-fast), `auto` runs autotune."""
+    name = os.environ.get("GLIMEPIRIDE_SOLVER_PROFILE", "interactive-fast")
+    if name == "auto":
+        return autotune(bound=float(os.environ.get("GLIMEPIRIDE_SOLVER_ERROR_BOUND", ERROR_BOUND)), repeat=1)[0]
+    if name not in PROFILES:
+        raise ValueError(f"Unsupported solver profile '{name}', use one of {list(PROFILES)} or 'auto'.")
+    return PROFILES[name]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Select the fastest integrator profile within a PK error bound.")
+    parser.add_argument("--bound", type=float, default=ERROR_BOUND, help="maximal relative PK error")
+    parser.add_argument("--repeat", type=int, default=3, help="repetitions of the timing")
+    args = parser.parse_args()
+
+    selected, results = autotune(bound=args.bound, repeat=args.repeat)
+    print(f"{'profile':<24}{'PK error':>12}{'time [s]':>12}")
+    print("-" * 48)
+    for name, (error, seconds) in results.items():
+        print(f"{name:<24}{error:>12.2e}{seconds:>12.4f}{'  selected' if name == selected.name else ''}")
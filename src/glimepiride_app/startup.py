@@ -0,0 +1,87 @@
+"""Startup time report with an import-time budget.
+
+Times the stages of the first session in a fresh interpreter
+```
+cd src
+python -m glimepiride_app.startup --modules 15
+```
+The exit code is 1 if a stage exceeds its budget.
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+# patient used for the first simulation
+PATIENT = {"PODOSE_gli": 4.0, "BW": 75.0, "f_cirrhosis": 0.0, "KI__f_renal_function": 1.0, "LI__f_cyp2c9": 1.0}
+
+# (stage, code, budget [s]) in order of the first session
+STAGES: List[Tuple[str, str, float]] = [
+    ("import pandas", "import pandas", 0.6),
+    ("import marimo", "import marimo", 0.6),
+    ("import glimepiride_app", "from glimepiride_app import pk, pool, simulation", 0.2),
+    ("load grid", "from glimepiride_app.grid import simulation_grid", 0.5),
+    ("grid lookup", "simulation_grid.lookup(PATIENT) if simulation_grid else None", 0.01),
+    ("import roadrunner", "import roadrunner", 0.3),
+    ("load model", "with pool.roadrunner_pool.checkout() as r: pass", 1.0),
+    ("simulation", "with pool.roadrunner_pool.checkout() as r: df = simulation.simulate(r, PATIENT)", 0.1),
+    ("pk parameters", "pk.pk_table(df)", 0.01),
+    ("import plotly", "import plotly.graph_objects", 0.5),
+]
+
+
+def time_stages() -> Dict[str, float]:
+    """Execute the stages in order and measure the time per stage [s]."""
+    namespace = {"PATIENT": PATIENT}
+    times = {}
+    for stage, code, _ in STAGES:
+        start = time.perf_counter()
+        exec(code, namespace)
+        times[stage] = time.perf_counter() - start
+    return times
+
+
+def slowest_modules(n: int) -> List[Tuple[float, str]]:
+    """Slowest imports (cumulative [s]) of the app modules via `python -X importtime`."""
+    code = "import pandas, marimo, roadrunner, plotly.graph_objects; from glimepiride_app import grid, pk, pool, simulation"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|(\s*)(\S+)", line)
+        # only top-level imports
+        if match and len(match.group(2)) <= 1:
+            modules.append((int(match.group(1)) / 1e6, match.group(3)))
+    return sorted(modules, reverse=True)[:n]
+
+
+def report(times: Dict[str, float]) -> bool:
+    """Print report, returns True if all stages are within budget."""
+    ok = True
+    print(f"{'stage':<24}{'time [s]':>10}{'budget [s]':>12}")
+    print("-" * 50)
+    for stage, _, budget in STAGES:
+        within = times[stage] <= budget
+        ok &= within
+        print(f"{stage:<24}{times[stage]:>10.3f}{budget:>12.3f}{'' if within else '  EXCEEDED'}")
+    print("-" * 50)
+    print(f"{'total':<24}{sum(times.values()):>10.3f}{sum(s[2] for s in STAGES):>12.3f}")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Startup time report of the glimepiride app.")
+    parser.add_argument("--modules", type=int, default=0, help="report the N slowest imported modules")
+    args = parser.parse_args()
+
+    ok = report(time_stages())
+    if args.modules:
+        print(f"\n{'module':<38}{'cumulative [s]':>12}")
+        print("-" * 50)
+        for seconds, module in slowest_modules(args.modules):
+            print(f"{module:<38}{seconds:>12.3f}")
+    sys.exit(0 if ok else 1)
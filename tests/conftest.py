@@ -0,0 +1,33 @@
+"""Shared fixtures of the tests."""
+
+import os
+
+import pytest
+
+# API without the marimo UI
+os.environ.setdefault("GLIMEPIRIDE_UI", "0")
+
+# example patient at the default dose of the app
+PARAMETERS = {
+    "PODOSE_gli": 4.0,  # [mg]
+    "BW": 75.0,  # [kg]
+    "f_cirrhosis": 0.0,
+    "KI__f_renal_function": 1.0,
+    "LI__f_cyp2c9": 1.0,
+}
+
+
+@pytest.fixture(scope="session")
+def r():
+    """Model with the integrator settings of the app."""
+    from glimepiride_app.model import load_model
+    from glimepiride_app.solver import apply_profile, selected_profile
+
+    r = load_model()
+    apply_profile(r, selected_profile())
+    return r
+
+
+@pytest.fixture(scope="session")
+def parameters():
+    return dict(PARAMETERS)
@@ -0,0 +1,76 @@
+import pytest
+
+from glimepiride_app.api import DEFAULT_PARAMETERS, MAX_DOSES, ParameterError, parse_parameters
+
+
+def test_parse_parameters_defaults():
+    assert parse_parameters({}) == {**DEFAULT_PARAMETERS, "doses": 1, "interval": 24.0}
+
+
+def test_parse_parameters_accepts_valid():
+    parameters = parse_parameters({
+        "PODOSE_gli": 8, "BW": 110.5, "f_cirrhosis": 0.95, "KI__f_renal_function": 0.32,
+        "LI__f_cyp2c9": 0.0, "doses": 7, "interval": 12,
+    })
+    assert parameters["PODOSE_gli"] == 8.0
+    assert parameters["f_cirrhosis"] == 0.95
+    assert parameters["doses"] == 7 and isinstance(parameters["doses"], int)
+    assert parameters["interval"] == 12.0
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        [],
+        {"dose": 4},
+        {"PODOSE_gli": "4"},
+        {"PODOSE_gli": True},
+        {"PODOSE_gli": -1},
+        {"PODOSE_gli": float("nan")},
+        {"PODOSE_gli": float("inf")},
+        {"PODOSE_gli": 100},
+        {"BW": 0},
+        {"f_cirrhosis": 5.0},
+        {"KI__f_renal_function": 0},
+        {"KI__f_renal_function": 1.5},
+        {"LI__f_cyp2c9": 2.0},
+        {"doses": 0},
+        {"doses": 2.5},
+        {"doses": MAX_DOSES + 1},
+        {"interval": 0},
+    ],
+)
+def test_parse_parameters_rejects_invalid(data):
+    with pytest.raises(ParameterError):
+        parse_parameters(data)
+
+
+def test_simulate_endpoint_rejects_out_of_range():
+    pytest.importorskip("httpx")
+    from starlette.testclient import TestClient
+
+    from glimepiride_app.api import create_app
+
+    client = TestClient(create_app(ui=False))
+    response = client.post("/api/simulate", json={"f_cirrhosis": 5.0})
+    assert response.status_code == 422
+    assert "f_cirrhosis" in response.json()["error"]
+    assert client.post("/api/simulate", content=b"{").status_code == 400
+
+
+def test_steady_state_without_trajectories_skips_simulation(monkeypatch):
+    pytest.importorskip("httpx")
+    from starlette.testclient import TestClient
+
+    from glimepiride_app import api
+
+    def _simulate_patient(parameters):
+        raise AssertionError("multi-dose trajectory is not needed")
+
+    monkeypatch.setattr(api, "simulate_patient", _simulate_patient)
+    client = TestClient(api.create_app(ui=False))
+    response = client.post("/api/simulate?trajectories=false", json={"doses": 3, "interval": 24, "BW": 81})
+    assert response.status_code == 200
+    content = response.json()
+    assert "trajectories" not in content and "pk" not in content
+    assert content["steady_state"]["Glimepiride"]["cmax"] > 0
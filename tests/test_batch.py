@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from glimepiride_app.batch import batch_parameters, parameter_error, simulate_batch
+from glimepiride_app.model import SELECTIONS
+
+
+def test_parameter_error(parameters):
+    assert parameter_error(parameters) is None
+    assert "BW" in parameter_error({**parameters, "BW": 0.0})
+    assert "LI__f_cyp2c9" in parameter_error({**parameters, "LI__f_cyp2c9": float("nan")})
+    assert "PODOSE_gli" in parameter_error({**parameters, "PODOSE_gli": "4"})
+
+
+def test_batch_parameters_of_example_patients():
+    patients = pd.DataFrame([{"dose": 4.0, "weight": 80.0, "crcl": 55.0, "cirrhosis": 0.0, "allele1": 100, "allele2": 23}])
+    (index, parameters), = batch_parameters(patients)
+    assert index == 0
+    assert parameters["BW"] == 80.0
+    assert parameters["LI__f_cyp2c9"] == pytest.approx(0.615)
+
+
+def test_simulate_batch_reports_failed_patients(parameters, tmp_path):
+    patients = pd.DataFrame([parameters, {**parameters, "BW": 0.0}, {**parameters, "BW": 90.0}])
+    path = tmp_path / "trajectories.npz"
+    pk = simulate_batch(patients, processes=1, trajectories=path)
+
+    assert list(pk.index) == [0, 1, 2]
+    assert pk["error"].isna().tolist() == [True, False, True]
+    assert np.isnan(pk.loc[1, "Glimepiride_cmax"])
+    assert pk.loc[0, "Glimepiride_cmax"] > pk.loc[2, "Glimepiride_cmax"] > 0
+
+    trajectories = np.load(path)
+    assert sorted(trajectories.files) == ["0", "2", "columns"]
+    assert list(trajectories["columns"]) == SELECTIONS
+    assert trajectories["0"].shape[1] == len(SELECTIONS)
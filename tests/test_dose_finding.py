@@ -0,0 +1,25 @@
+import pytest
+
+from glimepiride_app.dose_finding import DOSE_BOUNDS, exposure, find_dose
+
+
+@pytest.mark.parametrize("metric", ["auc", "cmax"])
+def test_find_dose_converges(parameters, metric):
+    target = exposure({**parameters, "PODOSE_gli": 2.5}, metric=metric)
+    result = find_dose(parameters, target, metric=metric)
+    assert result.converged
+    assert result.exposure == pytest.approx(target, rel=1e-3)
+    assert result.dose == pytest.approx(2.5, rel=1e-2)
+    assert result.evaluations <= 4
+
+
+def test_find_dose_bounds(parameters):
+    upper = exposure({**parameters, "PODOSE_gli": DOSE_BOUNDS[1]})
+    result = find_dose(parameters, 2 * upper)
+    assert not result.converged
+    assert result.dose == DOSE_BOUNDS[1]
+
+
+def test_find_dose_unknown_metric(parameters):
+    with pytest.raises(ValueError):
+        find_dose(parameters, 1.0, metric="tmax")
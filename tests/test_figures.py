@@ -0,0 +1,36 @@
+import numpy as np
+
+from glimepiride_app.figures import downsample
+
+
+def test_downsample_keeps_extrema():
+    rng = np.random.default_rng(0)
+    t = np.linspace(0, 50, 20001)
+    y = np.sin(t) + rng.normal(0, 0.1, t.size)
+    index = downsample(t, y, pixels=100)
+
+    assert len(index) <= 2 * 100 + 2
+    assert np.all(np.diff(index) > 0)
+    assert index[0] == 0 and index[-1] == len(t) - 1
+    assert y.argmax() in index and y.argmin() in index
+    # extrema of every pixel column
+    edges = np.searchsorted(t, np.linspace(t[0], t[-1], 101))
+    edges[-1] = len(t)
+    for start, end in zip(edges[:-1], edges[1:]):
+        assert start + y[start:end].argmax() in index
+        assert start + y[start:end].argmin() in index
+
+
+def test_downsample_short_series_unchanged():
+    t = np.linspace(0, 50, 101)
+    np.testing.assert_array_equal(downsample(t, np.cos(t), pixels=100), np.arange(len(t)))
+
+
+def test_downsample_visible_range():
+    t = np.linspace(0, 50, 20001)
+    y = np.exp(-t / 10)
+    index = downsample(t, y, range_x=[10.001, 19.999], pixels=50)
+    # neighbours outside of the visible range are kept
+    assert t[index[0]] < 10.001 < t[index[1]]
+    assert t[index[-2]] < 19.999 < t[index[-1]]
+    assert len(index) <= 2 * 50 + 2
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from glimepiride_app.grid import SimulationGrid, build_grid
+from glimepiride_app.model import SELECTIONS
+from glimepiride_app.simulation import simulate
+
+STEPS = 100
+AXES = {
+    "PODOSE_gli": [2.0, 4.0, 6.0],
+    "BW": [60.0, 90.0],
+    "f_cirrhosis": [0.0, 0.4],
+    "KI__f_renal_function": [0.69, 1.0],
+    "LI__f_cyp2c9": [0.815, 1.0],
+}
+
+
+@pytest.fixture(scope="module")
+def grid():
+    return build_grid(axes=AXES, steps=STEPS)
+
+
+def test_lookup_grid_node(grid, r):
+    parameters = {"PODOSE_gli": 4.0, "BW": 60.0, "f_cirrhosis": 0.4, "KI__f_renal_function": 1.0, "LI__f_cyp2c9": 0.815}
+    df = grid.lookup(parameters)
+    assert df is not None
+    assert list(df.columns) == SELECTIONS
+    expected = simulate(r, parameters, steps=STEPS)
+    np.testing.assert_allclose(df.to_numpy(), expected.to_numpy(), rtol=1e-6, atol=1e-9)
+
+
+def test_interpolate_against_simulation(grid, r):
+    parameters = {"PODOSE_gli": 3.0, "BW": 75.0, "f_cirrhosis": 0.1, "KI__f_renal_function": 0.9, "LI__f_cyp2c9": 0.9}
+    values, error = grid.interpolate(parameters)
+    expected = simulate(r, parameters, steps=STEPS)[SELECTIONS[1:]].to_numpy().T
+    scale = np.abs(expected).max(axis=1, keepdims=True)
+    deviation = float((np.abs(values - expected) / scale).max())
+    assert deviation < 0.1
+    # estimated error is in the range of the actual error
+    assert deviation / 5 < error < 5 * deviation
+
+
+def test_lookup_tolerance_and_bounds(grid):
+    parameters = {"PODOSE_gli": 3.0, "BW": 75.0, "f_cirrhosis": 0.1, "KI__f_renal_function": 0.9, "LI__f_cyp2c9": 0.9}
+    strict = SimulationGrid(
+        axes=dict(zip(AXES, grid.axes)), time=grid.time, values=grid.values, profile=grid.profile, tolerance=0.0
+    )
+    assert strict.lookup(parameters) is None
+    assert (strict.hits, strict.misses) == (0, 1)
+    assert grid.interpolate({**parameters, "PODOSE_gli": 8.0}) is None
+    assert grid.lookup({**parameters, "BW": 40.0}) is None
+
+
+def test_save_and_load(grid, tmp_path):
+    path = tmp_path / "grid.npz"
+    grid.save(path)
+    loaded = SimulationGrid.load(path)
+    assert loaded is not None
+    assert loaded.profile == grid.profile
+    np.testing.assert_array_equal(loaded.values, grid.values)
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from glimepiride_app.metrics import Metrics
+
+
+def _samples(text: str):
+    """Sample name with labels -> value of the Prometheus text format."""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_render_histograms():
+    metrics = Metrics(prefix="test", buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.1, 0.5, 2.0):
+        metrics.observe("simulate", seconds)
+    metrics.observe("pk_table", 0.01)
+    text = metrics.render()
+
+    assert "# TYPE test_stage_seconds histogram" in text
+    samples = _samples(text)
+    # cumulative buckets, upper bounds are inclusive
+    assert samples['test_stage_seconds_bucket{stage="simulate",le="0.1"}'] == 2
+    assert samples['test_stage_seconds_bucket{stage="simulate",le="1.0"}'] == 3
+    assert samples['test_stage_seconds_bucket{stage="simulate",le="+Inf"}'] == 4
+    assert samples['test_stage_seconds_count{stage="simulate"}'] == 4
+    assert samples['test_stage_seconds_sum{stage="simulate"}'] == pytest.approx(2.65)
+    assert samples['test_stage_seconds_count{stage="pk_table"}'] == 1
+    assert text.endswith("\n")
+
+
+def test_render_collectors():
+    metrics = Metrics(prefix="test")
+    hits = [0]
+    metrics.register("cache_hits_total", "counter", "Cache hits.", lambda: hits[0])
+    hits[0] = 3
+    text = metrics.render()
+    assert "# HELP test_cache_hits_total Cache hits." in text
+    assert "# TYPE test_cache_hits_total counter" in text
+    # values are read on rendering
+    assert _samples(text)["test_cache_hits_total"] == 3
+
+
+def test_span_and_trace_log(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    metrics = Metrics(prefix="test", trace_log=str(path))
+    tid = metrics.trace()
+    with pytest.raises(ValueError):
+        with metrics.span("failing"):
+            raise ValueError()
+    with metrics.span("simulate"):
+        pass
+
+    samples = _samples(metrics.render())
+    # failing stages are timed as well
+    assert samples['test_stage_seconds_count{stage="failing"}'] == 1
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [record["stage"] for record in records] == ["failing", "simulate"]
+    assert {record["trace"] for record in records} == {tid}
@@ -0,0 +1,69 @@
+import shutil
+
+import numpy as np
+import pytest
+import roadrunner
+
+from glimepiride_app.model import MODEL_PATH, SELECTIONS, load_model, state_path
+from glimepiride_app.simulation import simulate
+
+
+@pytest.fixture
+def compilations(monkeypatch):
+    """Model paths passed to RoadRunner, i.e. SBML compilations."""
+    paths = []
+    original = roadrunner.RoadRunner
+
+    def _roadrunner(*args):
+        paths.extend(args)
+        return original(*args)
+
+    monkeypatch.setattr(roadrunner, "RoadRunner", _roadrunner)
+    return paths
+
+
+def _model_copy(directory, suffix: str = ""):
+    directory.mkdir()
+    path = directory / MODEL_PATH.name
+    shutil.copyfile(MODEL_PATH, path)
+    if suffix:
+        with open(path, "a") as f:
+            f.write(suffix)
+    return path
+
+
+def test_state_is_persisted_and_loaded(tmp_path, compilations, parameters):
+    model_path = _model_copy(tmp_path / "model")
+    state_dir = tmp_path / "state"
+
+    compiled = load_model(model_path, state_dir=state_dir)
+    assert state_path(state_dir, model_path).exists()
+    loaded = load_model(model_path, state_dir=state_dir)
+    assert compilations == [str(model_path)]
+    assert loaded.timeCourseSelections == SELECTIONS
+    np.testing.assert_allclose(simulate(loaded, parameters).to_numpy(), simulate(compiled, parameters).to_numpy())
+
+
+def test_changed_model_invalidates_state(tmp_path, compilations):
+    state_dir = tmp_path / "state"
+    model_path = _model_copy(tmp_path / "model")
+    changed_path = _model_copy(tmp_path / "changed", suffix="<!-- changed -->\n")
+    load_model(model_path, state_dir=state_dir)
+
+    load_model(changed_path, state_dir=state_dir)
+    assert compilations == [str(model_path), str(changed_path)]
+    # only the state of the current model is kept
+    assert list(state_dir.glob("*.rrstate")) == [state_path(state_dir, changed_path)]
+
+
+def test_corrupt_state_is_replaced(tmp_path, compilations):
+    model_path = _model_copy(tmp_path / "model")
+    state_dir = tmp_path / "state"
+    path = state_path(state_dir, model_path)
+    state_dir.mkdir()
+    path.write_bytes(b"corrupt")
+
+    r = load_model(model_path, state_dir=state_dir)
+    assert compilations == [str(model_path)]
+    assert r.timeCourseSelections == SELECTIONS
+    assert path.stat().st_size > len(b"corrupt")
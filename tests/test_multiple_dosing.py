@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from glimepiride_app.model import SELECTIONS
+from glimepiride_app.multiple_dosing import periodic_steady_state, steady_state_pk
+from glimepiride_app.pk import SUBSTANCES
+from glimepiride_app.simulation import simulate
+
+CONCENTRATIONS = [column for column, _ in SUBSTANCES.values()]
+
+
+@pytest.fixture(scope="module")
+def steady_state(r, parameters):
+    return periodic_steady_state(r, {**parameters, "interval": 24.0})
+
+
+def test_steady_state_pk_of_known_intervals():
+    t = np.linspace(0, 24, 5)
+    first = pd.DataFrame({"time": t, **{column: [0.0, 2.0, 1.0, 1.0, 0.5] for column in CONCENTRATIONS}})
+    df = pd.DataFrame({"time": t, **{column: [1.0, 3.0, 2.0, 2.0, 1.0] for column in CONCENTRATIONS}})
+    pk = steady_state_pk(first, df)
+    assert pk.keys() == SUBSTANCES.keys()
+    for p in pk.values():
+        assert (p.cmax, p.cmin) == (3.0, 1.0)
+        assert p.auctau == pytest.approx(6 * (2.0 + 2.5 + 2.0 + 1.5))
+        assert p.accumulation == pytest.approx(48.0 / 25.5)
+
+
+def test_steady_state_pk_without_dose():
+    t = np.linspace(0, 24, 5)
+    zeros = pd.DataFrame({"time": t, **{column: np.zeros_like(t) for column in CONCENTRATIONS}})
+    for p in steady_state_pk(zeros, zeros).values():
+        assert p.auctau == 0.0
+        assert np.isnan(p.accumulation)
+
+
+def test_first_interval_is_single_dose(r, parameters, steady_state):
+    first, _ = steady_state
+    single = simulate(r, parameters)
+    assert first["time"].iloc[-1] == pytest.approx(24.0)
+    expected = single[single["time"] <= 24.0 + 1e-9]
+    assert len(first) == len(expected)
+    np.testing.assert_allclose(first[CONCENTRATIONS].to_numpy(), expected[CONCENTRATIONS].to_numpy(), rtol=1e-3, atol=1e-6)
+
+
+def test_steady_state_is_periodic(steady_state):
+    first, df = steady_state
+    c = df[CONCENTRATIONS].to_numpy()
+    # trough to trough, i.e. the next interval starts with the same concentrations
+    np.testing.assert_allclose(c[-1], c[0], rtol=2e-3)
+    assert np.all(c.min(axis=0) > first[CONCENTRATIONS].to_numpy()[-1] * (1 - 2e-3))
+    assert list(df.columns) == SELECTIONS
+    assert steady_state_pk(first, df)["Glimepiride"].accumulation > 1.0
+
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from glimepiride_app.pk import PKParameters, pk_parameters, pk_table
+from glimepiride_app.simulation import simulate
+
+
+def test_pk_table_matches_timecourse_pk(r, parameters):
+    pytest.importorskip("pkdb_analysis")
+    from glimepiride_app.pk import pk_table_reference
+
+    df = simulate(r, parameters)
+    results = pk_table(df)
+    reference = pk_table_reference(df, dose=parameters["PODOSE_gli"])
+    assert results.keys() == reference.keys()
+    for substance, pk in results.items():
+        for name, value in pk.__dict__.items():
+            assert value == pytest.approx(float(getattr(reference[substance], name)), rel=1e-9), (substance, name)
+
+
+def test_pk_parameters_exponential_decay():
+    t = np.linspace(0, 24, 2401)
+    c = 2.0 * np.exp(-0.2 * t)
+    pk = pk_parameters(t, c)
+    assert pk.cmax == 2.0
+    assert pk.tmax == 0.0
+    assert pk.kel == pytest.approx(0.2)
+    assert pk.thalf == pytest.approx(np.log(2) / 0.2)
+    assert pk.auc == pytest.approx(10.0 * (1 - np.exp(-4.8)), rel=1e-4)
+    assert pk.aucinf == pytest.approx(10.0, rel=1e-4)
+
+
+def test_pk_parameters_without_concentrations():
+    t = np.linspace(0, 24, 25)
+    for c in (np.zeros_like(t), np.full_like(t, np.nan)):
+        pk = pk_parameters(t, c)
+        assert isinstance(pk, PKParameters)
+        assert all(np.isnan(value) for value in pk.__dict__.values())
+
+
+def test_pk_parameters_does_not_modify_input():
+    t = np.linspace(0, 24, 25)
+    c = np.exp(-0.1 * t)
+    c[0] = 0.0
+    copy = c.copy()
+    pk_parameters(t, c)
+    np.testing.assert_array_equal(c, copy)
@@ -0,0 +1,53 @@
+import queue
+
+import numpy as np
+import pytest
+
+from glimepiride_app.pool import RoadRunnerPool
+from glimepiride_app.simulation import simulate
+
+
+@pytest.fixture(scope="module")
+def pool():
+    return RoadRunnerPool(size=2)
+
+
+def test_checkout_is_bounded(pool):
+    with pool.checkout() as first, pool.checkout() as second:
+        assert first is not second
+        assert pool.created == 2
+        with pytest.raises(queue.Empty):
+            with pool.checkout(timeout=0.01):
+                pass
+    # idle instances are reused
+    with pool.checkout() as r:
+        assert r in (first, second)
+    assert pool.created == 2
+
+
+def test_cloned_instances_simulate_like_the_model(pool, r, parameters):
+    with pool.checkout() as first, pool.checkout() as second:
+        np.testing.assert_allclose(simulate(first, parameters).to_numpy(), simulate(second, parameters).to_numpy())
+        np.testing.assert_allclose(simulate(first, parameters).to_numpy(), simulate(r, parameters).to_numpy())
+
+
+def test_instances_are_returned_reset(pool):
+    with pool.checkout() as r:
+        bw = r.getValue("BW")
+        r.setValue("BW", bw + 10.0)
+    with pool.checkout() as reused:
+        assert reused is r
+        assert reused.getValue("BW") == bw
+
+
+def test_failed_creation_is_not_counted(monkeypatch):
+    pool = RoadRunnerPool(size=1)
+
+    def _fail():
+        raise RuntimeError("model could not be loaded")
+
+    monkeypatch.setattr(pool, "_create", _fail)
+    with pytest.raises(RuntimeError):
+        with pool.checkout():
+            pass
+    assert pool.created == 0
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from glimepiride_app.model import SELECTIONS
+from glimepiride_app.population import VARIABILITY, PopulationRun, PopulationSimulator, StreamingQuantiles, sample_patients
+
+QUANTILES = (0.05, 0.5, 0.95)
+
+
+def test_streaming_quantiles_match_numpy():
+    rng = np.random.default_rng(1)
+    # different distribution per element
+    data = rng.lognormal(mean=np.arange(6.0).reshape(2, 3), sigma=0.5, size=(5000, 2, 3))
+    estimates = StreamingQuantiles(QUANTILES, (2, 3))
+    for x in data:
+        estimates.update(x)
+
+    assert estimates.count == len(data)
+    result = estimates.result()
+    expected = np.quantile(data, QUANTILES, axis=0)
+    assert result.shape == expected.shape
+    np.testing.assert_allclose(result, expected, rtol=0.03)
+
+
+def test_streaming_quantiles_few_observations():
+    data = np.array([[3.0, 1.0], [1.0, 2.0], [2.0, 3.0]])
+    estimates = StreamingQuantiles(QUANTILES, (2,))
+    assert np.all(np.isnan(estimates.result()))
+    for x in data:
+        estimates.update(x)
+    np.testing.assert_allclose(estimates.result(), np.quantile(data, QUANTILES, axis=0))
+
+
+def test_sample_patients(parameters):
+    samples = sample_patients(parameters, 500, seed=0)
+    assert samples == sample_patients(parameters, 500, seed=0)
+    assert all(sample["PODOSE_gli"] == parameters["PODOSE_gli"] for sample in samples)
+    for pid, (_, _, lower, upper) in VARIABILITY.items():
+        values = np.array([sample[pid] for sample in samples])
+        assert np.all((lower <= values) & (values <= upper)), pid
+    bw = np.array([sample["BW"] for sample in samples])
+    assert np.median(bw) == pytest.approx(parameters["BW"], rel=0.03)
+
+
+class FailingSimulator(PopulationSimulator):
+    """Constant trajectories in chunks of 10, every third replicate fails."""
+
+    def iter_chunks(self, patients):
+        for k in range(0, len(patients), self.chunksize):
+            yield [
+                None if j % 3 == 0 else np.full((len(SELECTIONS) - 1, len(self.time)), 1.0, dtype=np.float32)
+                for j in range(k, min(k + self.chunksize, len(patients)))
+            ]
+
+
+def test_population_run_counts_failed_replicates(parameters):
+    run = PopulationRun(parameters, replicates=25, simulator=FailingSimulator(processes=1, steps=10))
+    bands = run.advance()
+    assert (bands.count, bands.failed) == (6, 4)
+    while not run.done:
+        bands = run.advance()
+    assert (bands.count, bands.failed, bands.replicates) == (16, 9, 25)
+    # failed replicates are not part of the bands
+    np.testing.assert_array_equal(bands.values["[Cve_gli]"], 1.0)
+
+
+def test_population_run_simulates_replicates(parameters):
+    run = PopulationRun(parameters, replicates=8, simulator=PopulationSimulator(processes=2, chunksize=4, steps=50))
+    try:
+        bands = run.advance(8)
+    finally:
+        run.close()
+    assert run.done
+    assert (bands.count, bands.failed) == (8, 0)
+    low, median, high = bands.values["[Cve_gli]"]
+    assert low.shape == bands.time.shape == (51,)
+    assert np.all(low <= median) and np.all(median <= high)
+    assert high.max() > 0
+
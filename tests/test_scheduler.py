@@ -0,0 +1,106 @@
+import gc
+import threading
+import time
+from concurrent.futures import CancelledError
+
+import pytest
+
+from glimepiride_app.scheduler import SimulationScheduler
+
+
+class BlockingSimulation:
+    """Simulation which blocks until released, records the started parameters."""
+
+    def __init__(self):
+        self.started = []
+        self.running = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, parameters):
+        self.started.append(parameters)
+        self.running.set()
+        assert self.release.wait(5)
+        if parameters.get("fail"):
+            raise RuntimeError("integrator failure")
+        return parameters
+
+
+@pytest.fixture
+def simulation():
+    return BlockingSimulation()
+
+
+def test_latest_request_wins(simulation):
+    scheduler = SimulationScheduler(simulate=simulation, workers=1)
+    running = scheduler.submit("a", {"step": 1})
+    assert simulation.running.wait(5)
+    queued = scheduler.submit("a", {"step": 2})
+    latest = scheduler.submit("a", {"step": 3})
+    simulation.release.set()
+
+    assert latest.result(5) == {"step": 3}
+    # started before the newer requests, the result is discarded
+    assert running.result(5) is None
+    assert queued.cancelled()
+    assert simulation.started == [{"step": 1}, {"step": 3}]
+    assert scheduler.superseded == 2
+
+
+def test_clients_do_not_supersede_each_other(simulation):
+    scheduler = SimulationScheduler(simulate=simulation, workers=1)
+    first = scheduler.submit("a", {"client": "a"})
+    second = scheduler.submit("b", {"client": "b"})
+    simulation.release.set()
+    assert first.result(5) == {"client": "a"}
+    assert second.result(5) == {"client": "b"}
+    assert scheduler.superseded == 0
+
+
+def test_run_returns_none_if_superseded(simulation):
+    scheduler = SimulationScheduler(simulate=simulation, workers=1)
+    scheduler.submit("a", {"step": 1})
+    assert simulation.running.wait(5)
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(value=scheduler.run("a", {"step": 2})))
+    thread.start()
+    # wait until the request of run is queued
+    deadline = time.monotonic() + 5
+    while "a" not in scheduler._pending and time.monotonic() < deadline:
+        time.sleep(0.001)
+    scheduler.submit("a", {"step": 3})
+    simulation.release.set()
+    thread.join(5)
+    assert result == {"value": None}
+
+
+def test_errors_are_raised_by_the_future(simulation):
+    scheduler = SimulationScheduler(simulate=simulation, workers=1)
+    simulation.release.set()
+    with pytest.raises(RuntimeError):
+        scheduler.submit("a", {"fail": True}).result(5)
+    assert scheduler.submit("a", {"step": 1}).result(5) == {"step": 1}
+
+
+def test_forget_cancels_queued_request(simulation):
+    scheduler = SimulationScheduler(simulate=simulation, workers=1)
+    scheduler.submit("a", {"client": "a"})
+    assert simulation.running.wait(5)
+    queued = scheduler.submit("b", {"client": "b"})
+    scheduler.forget("b")
+    simulation.release.set()
+
+    with pytest.raises(CancelledError):
+        queued.result(5)
+    assert {"client": "b"} not in simulation.started
+
+
+def test_clients_are_forgotten_when_collected(simulation):
+    scheduler = SimulationScheduler(simulate=simulation, workers=1)
+    client = scheduler.client()
+    other = scheduler.client()
+    assert client.key != other.key
+    assert scheduler.active_clients() == 2
+
+    del client
+    gc.collect()
+    assert scheduler.active_clients() == 1
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from glimepiride_app.model import PARAMETER_BOUNDS, PARAMETERS, SELECTIONS
+from glimepiride_app.sensitivity import perturbations, sensitivities
+from glimepiride_app.simulation import SimulationCache, simulate
+
+
+def test_perturbations_central(parameters):
+    parameters = {**parameters, "KI__f_renal_function": 0.5, "LI__f_cyp2c9": 0.5, "f_cirrhosis": 0.4}
+    items = perturbations(parameters)
+    assert [pid for pid, _, _ in items] == [pid for pid in PARAMETERS for _ in range(2)]
+    for k in range(0, len(items), 2):
+        (pid, low, p_low), (_, high, p_high) = items[k], items[k + 1]
+        value = parameters[pid]
+        assert (low, high) == pytest.approx((0.95 * value, 1.05 * value))
+        assert p_low[pid] == low and p_high[pid] == high
+        # other parameters are unchanged
+        assert all(p_low[other] == p_high[other] for other in PARAMETERS if other != pid)
+
+
+def test_perturbations_clipped_to_bounds(parameters):
+    items = {}
+    for pid, value, _ in perturbations({**parameters, "BW": 41.0}):
+        items.setdefault(pid, []).append(value)
+    # one-sided differences at the upper bound (normal renal function and CYP2C9 activity)
+    assert items["KI__f_renal_function"] == [pytest.approx(0.95), 1.0]
+    assert items["LI__f_cyp2c9"] == [pytest.approx(0.95), 1.0]
+    # clipped to the lower bound
+    assert items["BW"] == [PARAMETER_BOUNDS["BW"][0], pytest.approx(43.05)]
+    # parameters with value 0 are not perturbed
+    assert "f_cirrhosis" not in items
+    for values in items.values():
+        assert values[0] < values[1]
+
+
+def test_sensitivities_without_dose(parameters):
+    with pytest.raises(ValueError):
+        sensitivities({**parameters, "PODOSE_gli": 0.0})
+
+
+class SerialSimulator:
+    """Simulations in the test process instead of worker processes."""
+
+    def __init__(self, r):
+        self.r = r
+
+    def simulate(self, patients, output="uniform"):
+        return [simulate(self.r, p, output=output)[SELECTIONS].to_numpy() for p in patients]
+
+
+def test_sensitivities(r, parameters):
+    sens = sensitivities(parameters, cache=SimulationCache(), simulator=SerialSimulator(r))
+    gli = sens["Glimepiride"]
+    # slightly more than dose proportional
+    assert 1.0 < gli["auc"]["PODOSE_gli"] < 1.3
+    # lower CYP2C9 activity increases the exposure
+    assert gli["auc"]["LI__f_cyp2c9"] < 0
+    assert gli["auc"]["f_cirrhosis"] == 0.0
+    assert all(np.isfinite(value) for metric in gli.values() for value in metric.values())
@@ -0,0 +1,109 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from glimepiride_app.model import SELECTIONS
+from glimepiride_app.simulation import ADAPTIVE_TIMES, STEPS, SimulationCache, resample, simulate
+
+
+def _df(value: float) -> pd.DataFrame:
+    return pd.DataFrame(np.full((3, len(SELECTIONS)), value), columns=SELECTIONS)
+
+
+def _key(dose: float):
+    return (dose, 75.0, 0.0, 1.0, 1.0)
+
+
+def test_cache_lru_eviction():
+    cache = SimulationCache(maxsize=2)
+    cache.put(_key(1.0), _df(1.0))
+    cache.put(_key(2.0), _df(2.0))
+    # access makes the entry most recently used
+    assert cache.get(_key(1.0)) is not None
+    cache.put(_key(3.0), _df(3.0))
+
+    assert cache.get(_key(2.0)) is None
+    assert cache.get(_key(1.0)).iloc[0, 0] == 1.0
+    assert cache.get(_key(3.0)).iloc[0, 0] == 3.0
+
+
+def test_cache_results_are_read_only():
+    cache = SimulationCache()
+    data = cache.put(_key(1.0), _df(1.0))
+    assert not data.flags.writeable
+    with pytest.raises(ValueError):
+        data[0, 0] = 2.0
+
+    first, second = cache.get(_key(1.0)), cache.get(_key(1.0))
+    assert first is not second
+    assert np.shares_memory(first.to_numpy(), data)
+    assert not first.to_numpy().flags.writeable
+
+
+def test_cache_key_rounding(parameters):
+    cache = SimulationCache(ndigits=6)
+    assert cache.key(parameters) == cache.key({**parameters, "BW": parameters["BW"] + 1e-9})
+    assert cache.key({**parameters, "f_cirrhosis": -0.0}) == cache.key(parameters)
+
+
+def test_cache_directory(tmp_path):
+    SimulationCache(directory=tmp_path).put(_key(1.0), _df(1.0))
+    df = SimulationCache(directory=tmp_path).get(_key(1.0))
+    assert df is not None
+    np.testing.assert_array_equal(df.to_numpy(), _df(1.0).to_numpy())
+
+
+def test_cache_simulate(r, parameters):
+    cache = SimulationCache()
+    df = cache.simulate(r, parameters)
+    assert (cache.hits, cache.misses) == (0, 1)
+    pd.testing.assert_frame_equal(cache.simulate(r, parameters), df)
+    assert (cache.hits, cache.misses) == (1, 1)
+    pd.testing.assert_frame_equal(df, simulate(r, parameters))
+
+
+
+def test_cache_directory_eviction(tmp_path):
+    cache = SimulationCache(maxsize=1, directory=tmp_path, disk_maxsize=3)
+    for k, dose in enumerate([1.0, 2.0, 3.0]):
+        cache.put(_key(dose), _df(dose))
+        os.utime(cache._path(_key(dose)), (k, k))
+    # disk hit refreshes the least recently used file
+    cache.clear()
+    assert cache.get(_key(1.0)) is not None
+    cache.put(_key(4.0), _df(4.0))
+
+    cache.clear()
+    assert len(list(tmp_path.glob("*.npy"))) == 3
+    assert cache.get(_key(2.0)) is None
+    for dose in (1.0, 3.0, 4.0):
+        assert cache.get(_key(dose)) is not None
+
+
+def test_cache_evict_without_directory():
+    assert SimulationCache().evict() == 0
+
+
+def test_simulate_outputs(r, parameters):
+    uniform = simulate(r, parameters)
+    assert list(uniform.columns) == SELECTIONS
+    assert len(uniform) == STEPS + 1
+    assert resample(uniform) is uniform
+
+    adaptive = simulate(r, parameters, output="adaptive")
+    assert len(adaptive) == len(ADAPTIVE_TIMES)
+    resampled = resample(adaptive)
+    assert len(resampled) == STEPS + 1
+    assert resampled["time"].iloc[-1] == pytest.approx(uniform["time"].iloc[-1])
+
+    variable = simulate(r, parameters, output="variable")
+    assert variable["time"].iloc[-1] == pytest.approx(uniform["time"].iloc[-1])
+    assert len(variable) < len(uniform)
+    # variable step size is only used for the variable output
+    assert not r.integrator.variable_step_size
+
+    with pytest.raises(ValueError):
+        simulate(r, parameters, output="unknown")
+